@@ -0,0 +1,187 @@
+import threading
+
+import pandas as pd
+
+# --- COLUMNAR RESULTS MODEL ---
+# One candidate table and one ward table per snapshot, across all ULBs, with
+# every tally computed by vectorized group-bys. Build it with for_snapshot(),
+# which only does the work once per snapshot however many viewers ask.
+
+WARD_KEY = ['district_id', 'ulb_id', 'ward']
+
+# Summary fields of a TSEC results page (the spelling is TSEC's)
+SUMMARY_FIELDS = {
+    'total_voters': 'Total Voters in Municipality Ward',
+    'valid_votes': 'Total Vaild Votes',
+    'rejected_votes': 'Rejected Votes',
+    'nota_votes': 'NOTA Votes',
+}
+
+WARD_STATUSES = ['Declared', 'Pending', 'Connection Error']
+
+
+def normalize_party(party):
+    return 'Independent' if party.upper() == 'IND' else party
+
+
+def is_winner_status(status):
+    """Same rule as scraper.build_ward_result uses to declare a ward."""
+    status = status.lower()
+    return "elected" in status or "won" in status
+
+
+class Analytics:
+    """
+    Columnar view of one snapshot.
+
+    `candidates` has one row per candidate of every polled ward with
+    categorical `party` (IND folded into Independent) and `status` columns;
+    `wards` has one row per ward with its status and numeric summary fields.
+
+    Tallies are computed on first use and memoized, per ULB (None for all
+    ULBs), for the life of the snapshot; callers must not modify them.
+    """
+
+    def __init__(self, snapshot):
+        self.version = snapshot.version
+        self.candidates = self._candidate_frame(snapshot.wards)
+        self.wards = self._ward_frame(snapshot.wards)
+        self._ward_rows = self.candidates.groupby(WARD_KEY, sort=False).indices if len(self.candidates) else {}
+        self._memo = {}
+
+    def _memoized(self, compute, ulb):
+        key = (compute.__name__, ulb)
+        if key not in self._memo:
+            self._memo[key] = compute(ulb)
+        return self._memo[key]
+
+    @staticmethod
+    def _candidate_frame(wards):
+        columns = {name: [] for name in WARD_KEY + ['sl_no', 'candidate', 'party', 'votes', 'status']}
+        for item in wards:
+            for cand in item.get('candidates', ()):
+                columns['district_id'].append(item['district_id'])
+                columns['ulb_id'].append(item['ulb_id'])
+                columns['ward'].append(item['ward'])
+                columns['sl_no'].append(cand['Sl No'])
+                columns['candidate'].append(cand['Candidate Name'])
+                columns['party'].append(cand['Party'])
+                columns['votes'].append(cand['Votes'])
+                columns['status'].append(cand['Status'])
+
+        frame = pd.DataFrame(columns)
+        frame['ward'] = frame['ward'].astype('int64')
+        frame['votes'] = frame['votes'].astype('int64')
+        # Mapping a categorical only evaluates normalize_party once per distinct party
+        frame['party'] = frame['party'].astype('category').map(normalize_party).astype('category')
+        statuses = frame['status'].astype('category')
+        frame['status'] = statuses
+        elected_statuses = {s for s in statuses.cat.categories if is_winner_status(s)}
+        frame['elected'] = statuses.isin(elected_statuses)
+        return frame
+
+    @staticmethod
+    def _ward_frame(wards):
+        frame = pd.DataFrame({
+            'district_id': [item['district_id'] for item in wards],
+            'ulb_id': [item['ulb_id'] for item in wards],
+            'ward': pd.Series([item['ward'] for item in wards], dtype='int64'),
+            'status': pd.Categorical([item['status'] for item in wards], categories=WARD_STATUSES),
+            'reserved_for': [item.get('summary', {}).get('Reserved for') for item in wards],
+            **{
+                column: pd.to_numeric(
+                    pd.Series([item.get('summary', {}).get(field) for item in wards], dtype='object'),
+                    errors='coerce',
+                )
+                for column, field in SUMMARY_FIELDS.items()
+            },
+        })
+        polled = frame['valid_votes'] + frame['rejected_votes'].fillna(0)
+        frame['turnout'] = polled / frame['total_voters'].where(frame['total_voters'] > 0)
+        return frame
+
+    def _in_ulb(self, frame, ulb):
+        if ulb is None:
+            return frame
+        district_id, ulb_id = ulb
+        return frame[(frame['district_id'] == district_id) & (frame['ulb_id'] == ulb_id)]
+
+    def ward_candidates(self, ulb, ward):
+        """Candidate rows of one ward, in page order."""
+        rows = self._ward_rows.get((*ulb, ward))
+        if rows is None:
+            return self.candidates.iloc[0:0]
+        return self.candidates.iloc[rows]
+
+    def winners(self, ulb=None):
+        """One row per declared ward: its first elected candidate."""
+        return self._memoized(self._winners, ulb)
+
+    def _winners(self, ulb):
+        elected = self._in_ulb(self.candidates, ulb)
+        return elected[elected['elected']].drop_duplicates(WARD_KEY)
+
+    def seat_tally(self, ulb=None):
+        """Party / Wards Won, most seats first."""
+        return self._memoized(self._seat_tally, ulb)
+
+    def _seat_tally(self, ulb):
+        seats = self.winners(ulb).groupby('party', observed=True).size()
+        tally = seats.rename('Wards Won').rename_axis('Party').reset_index()
+        return tally.sort_values(['Wards Won', 'Party'], ascending=[False, True], ignore_index=True)
+
+    def vote_share(self, ulb=None):
+        """Party / Votes / Vote Share (fraction of all candidate votes counted), largest first."""
+        return self._memoized(self._vote_share, ulb)
+
+    def _vote_share(self, ulb):
+        votes = self._in_ulb(self.candidates, ulb).groupby('party', observed=True)['votes'].sum()
+        total = votes.sum()
+        share = pd.DataFrame({'Votes': votes, 'Vote Share': votes / total if total else 0.0})
+        share = share.rename_axis('Party').reset_index()
+        return share.sort_values('Votes', ascending=False, ignore_index=True)
+
+    def margins(self, ulb=None):
+        """Per declared ward: winner's votes, runner-up's votes and the margin in votes and share of valid votes."""
+        return self._memoized(self._margins, ulb)
+
+    def _margins(self, ulb):
+        candidates = self._in_ulb(self.candidates, ulb)
+        ranked = candidates.sort_values(WARD_KEY + ['votes'], ascending=[True, True, True, False])
+        rank = ranked.groupby(WARD_KEY, sort=False).cumcount()
+        top = ranked[rank == 0].set_index(WARD_KEY)['votes']
+        second = ranked[rank == 1].set_index(WARD_KEY)['votes']
+        frame = pd.DataFrame({'winner_votes': top, 'runner_up_votes': second.reindex(top.index, fill_value=0)})
+        frame['margin'] = frame['winner_votes'] - frame['runner_up_votes']
+        declared = self.winners(ulb).set_index(WARD_KEY).index
+        frame = frame[frame.index.isin(declared)]
+        valid = self.wards.set_index(WARD_KEY)['valid_votes'].reindex(frame.index)
+        frame['margin_share'] = frame['margin'] / valid.where(valid > 0)
+        return frame.reset_index()
+
+    def turnout(self, ulb=None):
+        """Turnout across the wards with summary figures: (valid + rejected votes) / registered voters."""
+        return self._memoized(self._turnout, ulb)
+
+    def _turnout(self, ulb):
+        wards = self._in_ulb(self.wards, ulb).dropna(subset=['total_voters', 'valid_votes'])
+        voters = wards['total_voters'].sum()
+        if not voters:
+            return None
+        return float((wards['valid_votes'] + wards['rejected_votes'].fillna(0)).sum() / voters)
+
+
+_cache = {}  # id(snapshot) -> (snapshot, Analytics); holds the snapshot so the id stays unique
+_cache_lock = threading.Lock()
+
+def for_snapshot(snapshot):
+    """Returns the Analytics of `snapshot`, built at most once per snapshot and shared by every caller."""
+    with _cache_lock:
+        entry = _cache.get(id(snapshot))
+        if entry is not None and entry[0] is snapshot:
+            return entry[1]
+        analytics = Analytics(snapshot)
+        if len(_cache) >= 2:
+            _cache.clear()
+        _cache[id(snapshot)] = (snapshot, analytics)
+        return analytics
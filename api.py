@@ -0,0 +1,417 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import selectors
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from config import TARGETS, TARGETS_BY_KEY
+from scraper import ward_key
+
+logger = logging.getLogger(__name__)
+
+# --- API CONFIGURATION ---
+API_PORT = int(os.environ.get("TSEC_API_PORT", "0"))  # 0 disables the API in the dashboard process
+STREAM_KEEPALIVE = 15  # Seconds between keep-alive comments on an idle event stream
+STREAM_TICK = 0.5      # Seconds between the stream thread's checks for a new snapshot
+MAX_STREAM_BUFFER = 1 << 20  # Bytes a stream client may fall behind before it is dropped
+
+# Read-only routes, all served from the poller's latest snapshot:
+#   GET /api/ulbs                             every configured ULB with ward counts
+#   GET /api/ulbs/<district_id>/<ulb_id>      one ULB and all its wards
+#   GET /api/ulbs/<district_id>/<ulb_id>/wards/<ward>
+#   GET /api/stream[?district_id=..&ulb_id=..]  server-sent events: the current
+#       wards once ("snapshot"), then only wards that changed ("diff")
+
+
+def _encode(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _event(name, snapshot, wards):
+    payload = _encode({"version": snapshot.version, "fetched_at": snapshot.fetched_at, "wards": wards})
+    return b"id: %d\nevent: %s\ndata: " % (snapshot.version, name.encode()) + payload + b"\n\n"
+
+
+def _selected(wards, ulb):
+    """`wards` of ULB `ulb`, or all of them for (None, None)."""
+    if ulb == (None, None):
+        return list(wards)
+    return [w for w in wards if (w['district_id'], w['ulb_id']) == ulb]
+
+
+def ward_diff(old, new):
+    """Wards of snapshot `new` that are missing from, or different in, snapshot `old`."""
+    if old is None:
+        return list(new.wards)
+    previous = {ward_key(w): w for w in old.wards}
+    changed = []
+    for ward in new.wards:
+        before = previous.get(ward_key(ward))
+        if before is not ward and before != ward:
+            changed.append(ward)
+    return changed
+
+
+class ResultsApi:
+    """
+    Builds API responses from a Poller's snapshots.
+
+    Bodies only depend on the data they show, never on the snapshot version,
+    so a ward's ETag stays the same until the ward itself changes. Encoded
+    bodies and diffs are computed once per snapshot version and shared by
+    every client.
+    """
+
+    def __init__(self, poller):
+        self.poller = poller
+        self._bodies = {}  # path -> (version, etag, body)
+        self._diffs = {}   # (old version, new version) -> changed wards
+        self._lock = threading.Lock()
+
+    def resource(self, path, snapshot=None):
+        """
+        Returns (snapshot, etag, body) for a JSON route, or None when it does
+        not exist. `snapshot` defaults to the poller's latest.
+        """
+        route = self._route(path)
+        snapshot = snapshot or self.poller.latest()
+        if route is None or snapshot is None:
+            return None
+        with self._lock:
+            cached = self._bodies.get(route)
+        if cached is not None and cached[0] == snapshot.version:
+            return snapshot, cached[1], cached[2]
+
+        payload = self._payload(route, snapshot)
+        if payload is None:
+            return None
+        body = _encode(payload)
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        with self._lock:
+            self._bodies[route] = (snapshot.version, etag, body)
+        return snapshot, etag, body
+
+    def diff(self, old, new):
+        key = (old.version if old else 0, new.version)
+        with self._lock:
+            changed = self._diffs.get(key)
+        if changed is None:
+            changed = ward_diff(old, new)
+            with self._lock:
+                if len(self._diffs) >= 8:
+                    self._diffs.clear()
+                self._diffs[key] = changed
+        return changed
+
+    @staticmethod
+    def _route(path):
+        """(ulb key or None, ward or None) for a known route, else None."""
+        parts = [part for part in path.split('/') if part]
+        if parts in (['api'], ['api', 'ulbs']):
+            return None, None
+        if len(parts) in (4, 6) and parts[:2] == ['api', 'ulbs'] and (parts[2], parts[3]) in TARGETS_BY_KEY:
+            if len(parts) == 4:
+                return (parts[2], parts[3]), None
+            if parts[4] == 'wards' and parts[5].isdigit():
+                return (parts[2], parts[3]), int(parts[5])
+        return None
+
+    def _payload(self, route, snapshot):
+        ulb, ward = route
+        if ulb is None:
+            return {"ulbs": [self._ulb_summary(target, snapshot) for target in TARGETS]}
+        wards = snapshot.by_ulb.get(ulb, ())
+        if ward is None:
+            return dict(self._ulb_summary(TARGETS_BY_KEY[ulb], snapshot), wards=list(wards))
+        return next((w for w in wards if w['ward'] == ward), None)
+
+    @staticmethod
+    def _ulb_summary(target, snapshot):
+        wards = snapshot.by_ulb.get(target.key, ())
+        return {
+            "district_id": target.district_id,
+            "ulb_id": target.ulb_id,
+            "name": target.name,
+            "district": target.district,
+            "year": target.year,
+            "wards": target.wards,
+            "polled": len(wards),
+            "declared": sum(1 for w in wards if w['status'] == 'Declared'),
+        }
+
+
+# --- HTTP SERVER ---
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "TsecResultsApi/1.0"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip('/') == '/api/stream':
+            self._stream(parse_qs(url.query))
+            return
+
+        found = self.server.api.resource(url.path.rstrip('/'))
+        if found is None:
+            self._send_json(404, _encode({"error": "not found"}))
+            return
+        snapshot, etag, body = found
+        if etag in (tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')):
+            self.send_response(304)
+            self._common_headers(snapshot)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self._send_json(200, body, snapshot, etag)
+
+    def _common_headers(self, snapshot=None):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Cache-Control', 'no-cache')
+        if snapshot is not None:
+            self.send_header('X-Snapshot-Version', str(snapshot.version))
+
+    def _send_json(self, status, body, snapshot=None, etag=None):
+        self.send_response(status)
+        self._common_headers(snapshot)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, query):
+        """
+        Sends the headers and the first event, then hands the connection to
+        the server's StreamHub and returns, freeing this thread.
+        """
+        ulb = (query.get('district_id', [None])[0], query.get('ulb_id', [None])[0])
+        if ulb != (None, None) and ulb not in TARGETS_BY_KEY:
+            self._send_json(404, _encode({"error": "unknown ULB"}))
+            return
+
+        self.send_response(200)
+        self._common_headers()
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.end_headers()
+
+        poller = self.server.api.poller
+        last_id = self.headers.get('Last-Event-ID', '')
+        snapshot = poller.snapshot(int(last_id) if last_id.isdigit() else None)
+        try:
+            if snapshot is not None and str(snapshot.version) != last_id:
+                self.wfile.write(_event("snapshot", snapshot, _selected(snapshot.wards, ulb)))
+            # Otherwise the client reconnected with a version that is still retained:
+            # the hub sends it whatever changed since then
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        self.server.hub.add(self.connection, ulb, snapshot)
+
+
+class StreamHub:
+    """
+    Serves every open event stream from a single thread.
+
+    Each client gets a "diff" event with only the wards of its ULB that
+    changed when a new snapshot is published, and a keep-alive comment when
+    it has been sent nothing for STREAM_KEEPALIVE seconds. Sockets are
+    non-blocking and written through per-client buffers, so a slow client
+    never holds up the others; one more than MAX_STREAM_BUFFER bytes behind
+    is dropped. An open stream costs a socket and a buffer, not a thread.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._added = []    # (socket, ulb, snapshot) waiting to be registered by the hub thread
+        self._owned = set()  # sockets handed over and not closed yet
+        self._lock = threading.Lock()
+        self._version = None
+        threading.Thread(target=self._run, name="results-api-streams", daemon=True).start()
+
+    def add(self, sock, ulb, snapshot):
+        """Takes over `sock`, a stream that has been sent `snapshot` (None: nothing yet) for `ulb`."""
+        sock.setblocking(False)
+        with self._lock:
+            self._owned.add(sock)
+            self._added.append((sock, ulb, snapshot))
+        self._wake_w.send(b'\0')
+
+    def owns(self, sock):
+        with self._lock:
+            return sock in self._owned
+
+    def count(self):
+        with self._lock:
+            return len(self._owned)
+
+    def _run(self):
+        while True:
+            for key, mask in self._selector.select(timeout=STREAM_TICK):
+                if key.fileobj is self._wake_r:
+                    try:
+                        self._wake_r.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                if mask & selectors.EVENT_READ:
+                    # Clients send nothing after the request; readable means closed
+                    try:
+                        data = key.fileobj.recv(4096)
+                    except BlockingIOError:
+                        data = b'-'
+                    except OSError:
+                        data = b''
+                    if not data:
+                        self._drop(key.fileobj)
+                        continue
+                if mask & selectors.EVENT_WRITE:
+                    self._flush(key.fileobj, key.data)
+
+            with self._lock:
+                added, self._added = self._added, []
+            for sock, ulb, snapshot in added:
+                client = {"ulb": ulb, "snapshot": snapshot, "buffer": bytearray(), "sent_at": time.monotonic()}
+                self._selector.register(sock, selectors.EVENT_READ, client)
+                self._send_changes(sock, client, self.server.api.poller.latest())
+            self._publish()
+            self._keep_alive()
+
+    def _publish(self):
+        """Sends every client what changed for it since the snapshot it was last sent."""
+        api = self.server.api
+        latest = api.poller.latest()
+        if latest is None or latest.version == self._version:
+            return
+        self._version = latest.version
+        sent = False
+        for key in list(self._selector.get_map().values()):
+            if key.data is not None:
+                sent = self._send_changes(key.fileobj, key.data, latest) or sent
+        if sent:
+            # Kept while clients may reconnect with this version as their Last-Event-ID
+            api.poller.retain(latest)
+
+    def _send_changes(self, sock, client, latest):
+        old = client["snapshot"]
+        if latest is None or (old is not None and old.version == latest.version):
+            return False
+        changed = _selected(self.server.api.diff(old, latest), client["ulb"])
+        client["snapshot"] = latest
+        if not changed and old is not None:
+            return False
+        self._write(sock, client, _event("diff" if old is not None else "snapshot", latest, changed))
+        return True
+
+    def _keep_alive(self):
+        cutoff = time.monotonic() - STREAM_KEEPALIVE
+        for key in list(self._selector.get_map().values()):
+            if key.data is not None and key.data["sent_at"] < cutoff:
+                self._write(key.fileobj, key.data, b": keep-alive\n\n")
+
+    def _write(self, sock, client, data):
+        client["buffer"] += data
+        client["sent_at"] = time.monotonic()
+        if len(client["buffer"]) > MAX_STREAM_BUFFER:
+            logger.info("Dropping an event stream that is %d bytes behind", len(client["buffer"]))
+            self._drop(sock)
+            return
+        self._flush(sock, client)
+
+    def _flush(self, sock, client):
+        try:
+            sent = sock.send(client["buffer"])
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._drop(sock)
+            return
+        del client["buffer"][:sent]
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if client["buffer"] else 0)
+        if self._selector.get_key(sock).events != events:
+            self._selector.modify(sock, events, client)
+
+    def _drop(self, sock):
+        try:
+            self._selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        with self._lock:
+            self._owned.discard(sock)
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+
+class ApiServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer whose event streams are handed over to one StreamHub thread."""
+
+    daemon_threads = True
+
+    def __init__(self, address, handler):
+        super().__init__(address, handler)
+        self.hub = StreamHub(self)
+
+    def shutdown_request(self, request):
+        if self.hub.owns(request):
+            # The stream lives on in the hub, which closes it when the client goes away
+            return
+        super().shutdown_request(request)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_server(poller, port=API_PORT, host="0.0.0.0"):
+    """
+    Serves the API for `poller` on a daemon thread, once per process, and
+    returns the server (None when `port` is 0). Calling it again points the
+    running server at the new poller. Event streams are served by a
+    single StreamHub thread however many are open.
+    """
+    global _server
+    with _server_lock:
+        if _server is None and port:
+            _server = ApiServer((host, port), ApiHandler)
+            threading.Thread(target=_server.serve_forever, name="results-api", daemon=True).start()
+        if _server is not None:
+            _server.api = ResultsApi(poller)
+        return _server
+
+
+def main():
+    from poller import Poller
+    from store import SnapshotStore
+
+    parser = argparse.ArgumentParser(description="Serve the results API without the dashboard.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=API_PORT or 8000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    poller = Poller(store=SnapshotStore())
+    poller.start()
+    server = start_server(poller, args.port, args.host)
+    logger.info("Results API on http://%s:%d/api/ulbs", args.host, args.port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
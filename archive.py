@@ -0,0 +1,430 @@
+import argparse
+import atexit
+import bisect
+import concurrent.futures
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# --- RAW RESPONSE ARCHIVE ---
+# Every distinct results page TSEC returned, kept in an append-only SQLite
+# file indexed by ULB, ward and time. Pages are stored even when the parser
+# gets them wrong, so `python archive.py reparse` can rebuild the results
+# history with a fixed parser, and TSEC_REPLAY plays an archive back through
+# the dashboard. TSEC pages share almost all their markup, so each page is
+# zlib-compressed against a preset dictionary (the first page archived).
+ARCHIVE_PATH = os.environ.get(
+    "TSEC_ARCHIVE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tsec_archive.sqlite3")
+)  # "" disables archiving
+REPLAY_PATH = os.environ.get("TSEC_REPLAY", "")  # Archive the dashboard plays back instead of crawling TSEC
+REPLAY_SPEED = float(os.environ.get("TSEC_REPLAY_SPEED", "10"))  # Archive seconds played per wall-clock second
+COMPRESSION_LEVEL = 9
+DICTIONARY_SIZE = 32768  # zlib only uses the last 32 KiB of a preset dictionary
+REPARSE_CHUNK = 500      # Pages per re-parse task
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dictionaries (
+    id          INTEGER PRIMARY KEY,
+    data        BLOB    NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    district_id TEXT    NOT NULL,
+    ulb_id      TEXT    NOT NULL,
+    ward        INTEGER,           -- NULL for a consolidated page of the whole ULB
+    fetched_at  REAL    NOT NULL,
+    digest      BLOB    NOT NULL,  -- parsers.page_digest(), which ignores the Struts token
+    size        INTEGER NOT NULL,  -- uncompressed bytes
+    dictionary  INTEGER NOT NULL REFERENCES dictionaries (id),
+    body        BLOB    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_by_ward ON pages (district_id, ulb_id, ward, fetched_at);
+CREATE INDEX IF NOT EXISTS pages_by_time ON pages (fetched_at);
+"""
+
+
+def _compress(content, dictionary):
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=dictionary)
+    return compressor.compress(content) + compressor.flush()
+
+def _decompress(body, dictionary):
+    decompressor = zlib.decompressobj(zdict=dictionary)
+    return decompressor.decompress(body) + decompressor.flush()
+
+
+class PageArchive:
+    """
+    Append-only store of raw results pages.
+
+    A page is only added when it differs (token aside) from the newest page
+    archived for the same ward, so the archive grows with what changed on
+    TSEC, not with how often it was polled. `readonly` archives can be opened
+    by any number of processes while a crawler keeps appending.
+    """
+
+    def __init__(self, path=ARCHIVE_PATH, readonly=False):
+        self.path = path
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._dictionaries = dict(self._conn.execute("SELECT id, data FROM dictionaries"))
+        self._last = {}  # (district_id, ulb_id, ward or None) -> digest of the newest page
+        if not readonly:
+            rows = self._conn.execute(
+                "SELECT district_id, ulb_id, ward, digest FROM pages"
+                " WHERE id IN (SELECT MAX(id) FROM pages GROUP BY district_id, ulb_id, ward)"
+            )
+            self._last = {(district_id, ulb_id, ward): digest for district_id, ulb_id, ward, digest in rows}
+
+    def record(self, key, content, digest, fetched_at=None):
+        """
+        Appends the page `content` fetched for `key` (ward None for a
+        consolidated page) unless it matches the newest page of that key.
+        Returns True if it was stored.
+        """
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        with self._lock:
+            if self._last.get(key) == digest:
+                return False
+            if not self._dictionaries:
+                data = content[-DICTIONARY_SIZE:]
+                cursor = self._conn.execute("INSERT INTO dictionaries (data) VALUES (?)", (data,))
+                self._dictionaries[cursor.lastrowid] = data
+            dictionary = max(self._dictionaries)
+            self._conn.execute(
+                "INSERT INTO pages (district_id, ulb_id, ward, fetched_at, digest, size, dictionary, body)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, fetched_at or time.time(), digest, len(content), dictionary,
+                 _compress(content, self._dictionaries[dictionary])),
+            )
+            self._last[key] = digest
+        return True
+
+    def pages(self, first_id=0, last_id=None):
+        """[(id, key, fetched_at, content)] for pages first_id..last_id, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, district_id, ulb_id, ward, fetched_at, dictionary, body FROM pages"
+                " WHERE id >= ? AND id <= ? ORDER BY id",
+                (first_id, last_id if last_id is not None else sys.maxsize),
+            ).fetchall()
+        return [
+            (page_id, (district_id, ulb_id, ward), fetched_at, _decompress(body, self._dictionaries[dictionary]))
+            for page_id, district_id, ulb_id, ward, fetched_at, dictionary, body in rows
+        ]
+
+    def index(self):
+        """[(id, key, fetched_at)] of every page, oldest first, without reading the bodies."""
+        with self._lock:
+            return [
+                (page_id, (district_id, ulb_id, ward), fetched_at)
+                for page_id, district_id, ulb_id, ward, fetched_at in self._conn.execute(
+                    "SELECT id, district_id, ulb_id, ward, fetched_at FROM pages ORDER BY id"
+                )
+            ]
+
+    def page(self, page_id):
+        found = self.pages(page_id, page_id)
+        return found[0][3] if found else None
+
+    def latest(self, key, at=None):
+        """(id, fetched_at) of the newest page of `key` fetched at or before `at` (default: ever), or None."""
+        district_id, ulb_id, ward = key
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, fetched_at FROM pages WHERE district_id = ? AND ulb_id = ? AND ward IS ? AND fetched_at <= ?"
+                " ORDER BY fetched_at DESC, id DESC LIMIT 1",
+                (district_id, ulb_id, ward, at if at is not None else float('inf')),
+            ).fetchone()
+
+    def id_range(self):
+        with self._lock:
+            return self._conn.execute("SELECT MIN(id), MAX(id) FROM pages").fetchone()
+
+    def stats(self):
+        with self._lock:
+            pages, wards, first, last, size, stored = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT district_id || ':' || ulb_id || ':' || IFNULL(ward, '*')),"
+                " MIN(fetched_at), MAX(fetched_at), SUM(size), SUM(LENGTH(body)) FROM pages"
+            ).fetchone()
+        return {"pages": pages, "keys": wards, "first": first, "last": last,
+                "bytes": size or 0, "stored_bytes": stored or 0}
+
+
+_archive = None
+_archive_lock = threading.Lock()
+_pending = queue.Queue()  # (key, content, digest, fetched_at) waiting for the writer thread
+_writer = None
+
+def get_archive():
+    """The process-wide archive at ARCHIVE_PATH, opened on first use."""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = PageArchive(ARCHIVE_PATH)
+        return _archive
+
+def record_page(key, content, digest):
+    """
+    Queues a page the scraper has just fetched for the archive's writer
+    thread, so compression and the SQLite insert never hold up a fetch or
+    the asyncio event loop. Does nothing when archiving is disabled or
+    during a replay; write failures are logged, never raised.
+    """
+    global _writer
+    if not ARCHIVE_PATH or REPLAY_PATH:
+        return
+    with _archive_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_pages, name="page-archive", daemon=True)
+            _writer.start()
+    _pending.put((key, content, digest, time.time()))
+
+def _write_pages():
+    while True:
+        key, content, digest, fetched_at = _pending.get()
+        try:
+            get_archive().record(key, content, digest, fetched_at)
+        except Exception:
+            logger.warning("Could not archive the page of %s", key, exc_info=True)
+        finally:
+            _pending.task_done()
+
+def flush():
+    """Blocks until every queued page has been written."""
+    _pending.join()
+
+# Pages still queued at a clean exit are written before the process ends
+atexit.register(flush)
+
+
+# --- RE-PARSE ---
+
+def results_from_page(key, content):
+    """Per-ward results of an archived page, parsed with the current parser."""
+    import scraper
+
+    district_id, ulb_id, ward = key
+    if ward is not None:
+        results = [scraper.ward_result_from_page(ward, content)]
+    else:
+        results = list((scraper.bulk_results_from_page(content) or {}).values())
+    for result in results:
+        result['district_id'] = district_id
+        result['ulb_id'] = ulb_id
+    return results
+
+def _reparse_range(path, first_id, last_id, parser):
+    """
+    Worker process: ([(results, fetched_at)], [(key, fetched_at)]) for pages
+    first_id..last_id, the second list naming the pages the parser failed on.
+    """
+    import parsers
+
+    if parser:
+        parsers.PARSER_BACKEND = parser
+    archive = PageArchive(path, readonly=True)
+    observations, failed = [], []
+    for _, key, fetched_at, content in archive.pages(first_id, last_id):
+        try:
+            observations.append((results_from_page(key, content), fetched_at))
+        except Exception:
+            failed.append((key, fetched_at))
+    return observations, failed
+
+def reparse(path, out, workers=None, parser=None):
+    """
+    Re-parses every page of the archive at `path` on `workers` processes and
+    writes the resulting history to a new SnapshotStore at `out`, with each
+    change dated when its page was first fetched. Returns (pages, rows
+    written, [(key, fetched_at)] of the pages the parser failed on).
+    """
+    from store import SnapshotStore
+
+    if os.path.exists(out):
+        raise FileExistsError(f"{out} already exists; re-parse into a new file")
+    first, last = PageArchive(path, readonly=True).id_range()
+    if first is None:
+        return 0, 0, []
+    starts = range(first, last + 1, REPARSE_CHUNK)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        chunks = executor.map(_reparse_range, [path] * len(starts), starts,
+                              [start + REPARSE_CHUNK - 1 for start in starts], [parser] * len(starts))
+        observations, failed = [], []
+        for chunk_observations, chunk_failed in chunks:
+            observations.extend(chunk_observations)
+            failed.extend(chunk_failed)
+    return len(observations) + len(failed), SnapshotStore(out).record_many(observations), failed
+
+def compare(old_path, new_path):
+    """[(ward key, old result, new result)] for the wards whose latest result differs between two stores."""
+    from store import SnapshotStore
+
+    old = SnapshotStore(old_path).load_latest()
+    new = SnapshotStore(new_path).load_latest()
+    return [
+        (key, old.get(key, (None,))[0], new.get(key, (None,))[0])
+        for key in sorted(set(old) | set(new))
+        if old.get(key, (None,))[0] != new.get(key, (None,))[0]
+    ]
+
+
+# --- REPLAY ---
+
+class Replay:
+    """
+    Plays an archive back as if TSEC were serving it, `speed` times faster
+    than it was recorded. `fetch` has the signature of
+    scraper.fetch_all_data and returns, for each ward asked for, the result
+    of the newest page (its own or its ULB's consolidated page) archived by
+    the current replay time. Wards without a page yet are left out.
+    """
+
+    def __init__(self, path=REPLAY_PATH, speed=REPLAY_SPEED):
+        self.archive = PageArchive(path, readonly=True)
+        self.speed = speed
+        self._times = {}     # page key -> [fetched_at, ...] ascending
+        self._ids = {}       # page key -> [page id, ...] in the same order
+        for page_id, key, fetched_at in self.archive.index():
+            self._times.setdefault(key, []).append(fetched_at)
+            self._ids.setdefault(key, []).append(page_id)
+        all_times = [t for times in self._times.values() for t in times]
+        self.start = min(all_times) if all_times else 0.0
+        self.end = max(all_times) if all_times else 0.0
+        self._started = None
+        self._parsed = {}    # page id -> {ward: result}
+        self._lock = threading.Lock()
+
+    def clock(self):
+        """Current replay time (archive time); starts at the first page on the first fetch."""
+        if self._started is None:
+            self._started = time.time()
+        return self.start + (time.time() - self._started) * self.speed
+
+    def _newest(self, key, now):
+        times = self._times.get(key)
+        if not times:
+            return None
+        index = bisect.bisect_right(times, now) - 1
+        return (times[index], self._ids[key][index]) if index >= 0 else None
+
+    def _results(self, page_id, key):
+        with self._lock:
+            parsed = self._parsed.get(page_id)
+            if parsed is None:
+                try:
+                    parsed = {r['ward']: r for r in results_from_page(key, self.archive.page(page_id))}
+                except Exception:
+                    logger.warning("Skipping archived page %d of %s: it does not parse", page_id, key, exc_info=True)
+                    parsed = {}
+                self._parsed[page_id] = parsed
+            return parsed
+
+    def result(self, ward_key, now):
+        district_id, ulb_id, ward = ward_key
+        candidates = [
+            (page, key)
+            for key in (ward_key, (district_id, ulb_id, None))
+            for page in [self._newest(key, now)]
+            if page is not None
+        ]
+        for (_, page_id), key in sorted(candidates, reverse=True):
+            result = self._results(page_id, key).get(ward)
+            if result is not None:
+                return result
+        return None
+
+    def fetch(self, wards, progress=None, on_result=None, deadline=None):
+        now = self.clock()
+        results = []
+        for key in wards:
+            result = self.result(key, now)
+            if result is None:
+                continue
+            results.append(result)
+            if on_result:
+                on_result(result)
+            if progress:
+                progress(len(results), len(wards))
+        if now >= self.end:
+            logger.info("Replay reached the end of the archive")
+        return results
+
+def replay_poller(path=REPLAY_PATH, speed=REPLAY_SPEED):
+    """A Poller fed by a Replay of `path`, cycling `speed` times faster, with an in-memory result store."""
+    from poller import POLL_INTERVAL, Poller
+    from store import SnapshotStore
+
+    replay = Replay(path, speed)
+    return Poller(fetch=replay.fetch, interval=max(1.0, POLL_INTERVAL / speed), store=SnapshotStore(":memory:"))
+
+
+# --- COMMAND LINE ---
+
+def _parse_key(text):
+    district_id, ulb_id, ward = text.split(':')
+    return district_id, ulb_id, int(ward) if ward not in ('', '*') else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect, re-parse or export the raw TSEC page archive.")
+    parser.add_argument("--path", default=ARCHIVE_PATH or None, help="archive file (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="page count, time span and compression")
+    page = commands.add_parser("page", help="print the newest archived HTML of a ward")
+    page.add_argument("key", type=_parse_key, metavar="DISTRICT:ULB:WARD", help="ward * for the consolidated ULB page")
+    page.add_argument("--at", type=float, help="newest page fetched at or before this Unix time")
+    rebuild = commands.add_parser("reparse", help="re-parse every page into a new results database")
+    rebuild.add_argument("--out", required=True, help="new SQLite results file (use it as TSEC_DB_PATH)")
+    rebuild.add_argument("--workers", type=int, help="processes (default: one per core)")
+    rebuild.add_argument("--parser", help="parser backend (default: TSEC_PARSER)")
+    rebuild.add_argument("--compare", metavar="DB", help="results database to diff the rebuilt one against")
+    args = parser.parse_args()
+
+    if not args.path or not os.path.exists(args.path):
+        sys.exit(f"No archive at {args.path!r}")
+    if args.command == "stats":
+        stats = PageArchive(args.path, readonly=True).stats()
+        if not stats["pages"]:
+            print("Archive is empty")
+            return
+        print(f"{stats['pages']} pages of {stats['keys']} wards/ULBs, "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stats['first']))} to "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stats['last']))}")
+        print(f"{stats['bytes'] / 2 ** 20:.1f} MiB of HTML stored in {stats['stored_bytes'] / 2 ** 20:.2f} MiB "
+              f"({stats['bytes'] / max(1, stats['stored_bytes']):.0f}x)")
+    elif args.command == "page":
+        archive = PageArchive(args.path, readonly=True)
+        found = archive.latest(args.key, args.at)
+        if found is None:
+            sys.exit("No such page")
+        sys.stdout.buffer.write(archive.page(found[0]))
+    elif args.command == "reparse":
+        started = time.perf_counter()
+        pages, rows, failed = reparse(args.path, args.out, args.workers, args.parser)
+        print(f"Re-parsed {pages} pages in {time.perf_counter() - started:.1f}s; {rows} result changes written to {args.out}")
+        if failed:
+            print(f"{len(failed)} pages did not parse and were skipped (inspect them with the page command):")
+            for key, fetched_at in failed[:20]:
+                print(f"  {':'.join('*' if part is None else str(part) for part in key)} --at {fetched_at!r}")
+        if args.compare:
+            changed = compare(args.compare, args.out)
+            print(f"{len(changed)} wards end with a different result than in {args.compare}")
+            for key, old, new in changed[:20]:
+                print(f"  {':'.join(map(str, key))}: {old and old['status']} -> {new and new['status']}")
+
+
+if __name__ == "__main__":
+    main()
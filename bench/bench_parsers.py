@@ -0,0 +1,81 @@
+"""
+Parser micro-benchmark over saved TSEC result pages.
+
+Every backend must produce exactly the same rows and token as the bs4
+reference; the script fails loudly if one does not. For each backend it then
+reports CPU time per page and the projected parse CPU for one full crawl.
+
+    python bench/bench_parsers.py [--pages DIR] [--repeat N] [--wards 36]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parsers  # noqa: E402
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+
+
+def available_backends():
+    names = []
+    for name in parsers.BACKENDS:
+        try:
+            parsers.parse_page(b"<html></html>", backend=name)
+        except ImportError:
+            print(f"skipping {name}: not installed")
+            continue
+        names.append(name)
+    return names
+
+
+def parse_once(content, backend):
+    rows, token = parsers.parse_page(content, backend=backend)
+    return (parsers.rows_to_results(rows) if rows is not None else None), token
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default=PAGES_DIR, help="directory of saved *.html result pages")
+    parser.add_argument("--repeat", type=int, default=200, help="parses per page and backend")
+    parser.add_argument("--wards", type=int, default=36, help="wards per crawl cycle, for the projection")
+    args = parser.parse_args()
+
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(args.pages, "*.html"))):
+        with open(path, "rb") as f:
+            pages[os.path.basename(path)] = f.read()
+    if not pages:
+        sys.exit(f"no *.html pages found in {args.pages}")
+
+    backends = available_backends()
+    reference = {name: parse_once(content, "bs4") for name, content in pages.items()}
+
+    for backend in backends:
+        for name, content in pages.items():
+            if parse_once(content, backend) != reference[name]:
+                sys.exit(f"{backend} disagrees with bs4 on {name}")
+
+    print(f"{len(pages)} pages, {args.repeat} parses each, all backends agree with bs4\n")
+    print(f"{'backend':<8} {'us/page':>10} {'ms/cycle':>10} {'speedup':>8}")
+
+    per_page = {}
+    for backend in backends:
+        started = time.process_time()
+        for _ in range(args.repeat):
+            for content in pages.values():
+                parse_once(content, backend)
+        per_page[backend] = (time.process_time() - started) / (args.repeat * len(pages))
+
+    base = per_page.get("bs4")
+    for backend in backends:
+        cost = per_page[backend]
+        speedup = f"{base / cost:.1f}x" if base else "-"
+        print(f"{backend:<8} {cost * 1e6:>10.1f} {cost * args.wards * 1e3:>10.2f} {speedup:>8}")
+
+
+if __name__ == "__main__":
+    main()
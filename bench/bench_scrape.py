@@ -0,0 +1,150 @@
+"""
+End-to-end scrape benchmark against the local fake TSEC portal.
+
+Starts bench/fake_tsec.py in a subprocess (so its CPU is not counted), then
+runs scraper.fetch_all_data() for every combination of fetch engine and
+parser backend and reports, per combination:
+
+  cold   - the first cycle, starting with no client, token or parse cache
+  warm   - the average of the following cycles (the parse cache is now hot,
+           since the fake serves the same page for a ward until it changes)
+
+with wall time, requests sent per cycle, scraper CPU per ward, wards lost to
+Connection Errors (err) and wards whose status or winner differs from what
+the fake served (bad). Any bad ward makes the benchmark fail.
+
+    python bench/bench_scrape.py --ulbs 4 --wards 36 --latency 0.02:0.1 --cycles 3
+
+Add --bulk-ward-id all to measure consolidated ULB fetches (scraper.BULK_VARIANTS).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import fake_tsec
+
+
+def write_targets(args):
+    targets = {
+        "year": "2026",
+        "election_id": "190",
+        "requests_per_second": args.rps,
+        "request_burst": max(1, int(args.rps)),
+        "initial_in_flight": args.max_in_flight,
+        "max_in_flight": args.max_in_flight,
+        "breaker_failures": 1000000,
+        "targets": [
+            {"district_id": "99", "district": "Bench", "ulb_id": str(u), "name": f"ULB {u}", "wards": args.wards}
+            for u in range(1, args.ulbs + 1)
+        ],
+    }
+    handle, path = tempfile.mkstemp(prefix="bench-targets-", suffix=".json")
+    with os.fdopen(handle, "w") as f:
+        json.dump(targets, f)
+    return path
+
+
+def start_fake(args):
+    command = [sys.executable, os.path.join(BENCH_DIR, "fake_tsec.py"), "--port", "0", "--wards", str(args.wards),
+               "--latency", args.latency, "--error-rate", str(args.error_rate), "--token-uses", str(args.token_uses), "--seed", str(args.seed)]
+    for value in args.bulk_ward_id:
+        command += ["--bulk-ward-id", value]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("Fake TSEC listening on "):
+        process.kill()
+        sys.exit(f"fake TSEC did not start: {line!r}")
+    return process, line.rsplit(" ", 1)[1].strip()
+
+
+def fake_call(base_url, path, method="GET"):
+    root = base_url.rsplit("/", 1)[0]
+    request = urllib.request.Request(root + path, method=method, data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(request) as resp:
+        return json.loads(resp.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ulbs", type=int, default=1)
+    parser.add_argument("--wards", type=int, default=36, help="wards per ULB")
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--engines", default="threads,asyncio")
+    parser.add_argument("--parsers", default="fast,lxml,bs4")
+    parser.add_argument("--latency", default="0.02:0.1", help="fake server latency MIN:MAX seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--token-uses", type=int, default=0, help="POSTs per token before the fake rejects it")
+    parser.add_argument("--rps", type=float, default=1000.0, help="limiter rate; keep high to measure the engines")
+    parser.add_argument("--max-in-flight", type=int, default=16)
+    parser.add_argument("--bulk-ward-id", action="append", default=[], metavar="VALUE",
+                        help="let the fake answer this ward_id with a consolidated ULB page (see fake_tsec.py)")
+    parser.add_argument("--seed", type=int, default=1, help="fake portal seed")
+    args = parser.parse_args()
+
+    os.environ["TSEC_TARGETS"] = write_targets(args)
+    os.environ["TSEC_ARCHIVE_PATH"] = ""  # Fake pages must not reach the page archive (or its write cost the timings)
+    import parsers
+    import scraper
+
+    process, base_url = start_fake(args)
+    # Same seed and ratios as the subprocess, so it knows what every ward should show
+    truth = fake_tsec.FakeTsec(wards=args.wards, seed=args.seed)
+    mismatches = []
+    scraper.BASE_URL = base_url
+    total_wards = args.ulbs * args.wards
+    rows = []
+    try:
+        for engine in args.engines.split(","):
+            for backend in args.parsers.split(","):
+                scraper.FETCH_ENGINE = engine
+                parsers.PARSER_BACKEND = backend
+                scraper.reset_state()
+                cycles = []
+                for _ in range(args.cycles):
+                    fake_call(base_url, "/__reset", "POST")
+                    wall, cpu = time.perf_counter(), time.process_time()
+                    results = scraper.fetch_all_data()
+                    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+                    stats = fake_call(base_url, "/__stats")
+                    errors = sum(1 for r in results if r["status"] == "Connection Error")
+                    bad = 0
+                    for r in results:
+                        if r["status"] == "Connection Error":
+                            continue
+                        got = (r["status"], (r.get("winner") or {}).get("Candidate Name"))
+                        expected = truth.expected(r["district_id"], r["ulb_id"], r["ward"])
+                        if got != expected:
+                            bad += 1
+                            mismatches.append((engine, backend, scraper.ward_key(r), got, expected))
+                    cycles.append((wall, stats["get"] + stats["post"], cpu / total_wards, errors, bad))
+                cold, warm = cycles[0], cycles[1:] or cycles[:1]
+                rows.append((engine, backend, cold,
+                             tuple(sum(c[i] for c in warm) / len(warm) for i in range(5))))
+    finally:
+        process.kill()
+        os.unlink(os.environ["TSEC_TARGETS"])
+
+    print(f"{args.ulbs} ULB(s) x {args.wards} wards, fake latency {args.latency}s, {args.cycles} cycles\n")
+    print(f"{'engine':<8} {'parser':<6} | {'cold s':>7} {'req':>6} {'cpu ms/ward':>11} {'err':>4} {'bad':>4} |"
+          f" {'warm s':>7} {'req':>6} {'cpu ms/ward':>11} {'err':>4} {'bad':>4}")
+    for engine, backend, cold, warm in rows:
+        print(f"{engine:<8} {backend:<6} | {cold[0]:>7.2f} {cold[1]:>6.0f} {cold[2] * 1e3:>11.2f} {cold[3]:>4.0f} {cold[4]:>4.0f} |"
+              f" {warm[0]:>7.2f} {warm[1]:>6.0f} {warm[2] * 1e3:>11.2f} {warm[3]:>4.0f} {warm[4]:>4.0f}")
+    if mismatches:
+        print(f"\n{len(mismatches)} ward result(s) differ from what the fake served, first:")
+        for engine, backend, key, got, expected in mismatches[:10]:
+            print(f"  {engine}/{backend} {':'.join(map(str, key))}: got {got}, expected {expected}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
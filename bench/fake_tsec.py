@@ -0,0 +1,362 @@
+"""
+Local stand-in for tsec.gov.in/knowPRUrban.se.
+
+Issues Struts tokens on GET and answers the scraper's ward POSTs with
+GridView1 result pages, so the scraper can be tested and benchmarked offline
+without touching the real portal. Latency, 5xx errors, token expiry and
+"no table yet" pending pages can all be injected.
+
+With --bulk-ward-id VALUE, a POST whose property(ward_id) is VALUE (e.g.
+"all", or "" for an empty selector) returns every ward of the ULB that has
+results in one consolidated GridView1 table, each ward's rows introduced by
+a "Ward No : N" row. Without it, such POSTs get the form page back, as the
+real portal is assumed to do.
+
+    python bench/fake_tsec.py --port 8080 --wards 36 --latency 0.05:0.3 --error-rate 0.05
+    TSEC_BASE_URL=http://127.0.0.1:8080/knowPRUrban.se streamlit run dashboard.py
+
+Any district/ULB pair is served with --wards wards unless --ulb entries
+(DISTRICT:ULB:WARDS) say otherwise. GET /__stats returns the request
+counters as JSON and POST /__reset zeroes them.
+"""
+import argparse
+import json
+import random
+import secrets
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+TOKEN_FIELD = 'org.apache.struts.taglib.html.TOKEN'
+PARTIES = ['BJP', 'BRS', 'INC', 'AIMIM', 'CPI', 'IND', 'BSP']
+
+PAGE = """<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml">
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8" />
+<title>Telangana State Election Commission</title>
+<link href="css/bootstrap.min.css" rel="stylesheet" type="text/css" />
+<script type="text/javascript" src="js/jquery.min.js"></script>
+</head>
+<body>
+<div class="header"><h1>Telangana State Election Commission</h1></div>
+<ul class="nav">
+{nav}</ul>
+<div class="container">
+{message}
+<form name="knowPRUrbanForm" method="post" action="/knowPRUrban.se">
+<div><input type="hidden" name="{token_field}" value="{token}"></div>
+<input type="hidden" name="mode" value="getULBWMDetails">
+<table class="formTable" width="100%">
+<tr><td>District</td><td><select name="property(district_id)">
+{districts}</select></td></tr>
+<tr><td>ULB</td><td><select name="property(ulb_id)">
+{ulbs}</select></td></tr>
+<tr><td colspan="2" align="center"><input type="submit" value="Get Details" class="btn"></td></tr>
+</table>
+</form>
+{table}
+</div>
+<div class="footer">&copy; 2026 Telangana State Election Commission. All rights reserved.</div>
+</body>
+</html>
+"""
+
+NAV = ''.join(f'<li class="nav-item"><a class="nav-link" href="/page{i}.se">Menu item {i}</a></li>\n' for i in range(60))
+DISTRICTS = ''.join(f'<option value="{i}">District {i}</option>\n' for i in range(1, 34))
+ULBS = ''.join(f'<option value="{i}">Municipality {i}</option>\n' for i in range(1, 130))
+
+
+class FakeTsec:
+    """State and behaviour of the fake portal, shared by all handler threads."""
+
+    def __init__(self, wards=36, ulbs=None, latency=(0.0, 0.0), error_rate=0.0, token_ttl=0.0,
+                 token_uses=0, pending_ratio=0.2, counting_ratio=0.2, counting_seconds=0.0, seed=1, bulk_ward_ids=()):
+        self.default_wards = wards
+        self.ulbs = dict(ulbs or {})  # (district_id, ulb_id) -> ward count
+        self.latency = latency
+        self.error_rate = error_rate
+        self.token_ttl = token_ttl      # seconds a token stays valid (0 = forever)
+        self.token_uses = token_uses    # POSTs a token is valid for (0 = unlimited)
+        self.pending_ratio = pending_ratio
+        self.counting_ratio = counting_ratio
+        self.counting_seconds = counting_seconds
+        self.seed = seed
+        self.bulk_ward_ids = set(bulk_ward_ids)  # ward_id values answered with every ward of the ULB
+        self.started = time.monotonic()
+        self._tokens = {}  # token -> [issued_at, uses]
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"get": 0, "post": 0, "server_errors": 0, "token_rejections": 0,
+                          "pending_pages": 0, "result_pages": 0, "bulk_pages": 0, "connections": 0}
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def ward_count(self, district_id, ulb_id):
+        return self.ulbs.get((district_id, ulb_id), self.default_wards)
+
+    # --- tokens ---
+
+    def issue_token(self):
+        token = secrets.token_hex(16)
+        with self._lock:
+            self._tokens[token] = [time.monotonic(), 0]
+        return token
+
+    def accept_token(self, token):
+        with self._lock:
+            entry = self._tokens.get(token)
+            if entry is None:
+                return False
+            if self.token_ttl and time.monotonic() - entry[0] > self.token_ttl:
+                del self._tokens[token]
+                return False
+            entry[1] += 1
+            if self.token_uses and entry[1] > self.token_uses:
+                del self._tokens[token]
+                return False
+            return True
+
+    # --- faults ---
+
+    def delay(self):
+        low, high = self.latency
+        if high > 0:
+            with self._lock:
+                wait = self._rng.uniform(low, high)
+            time.sleep(wait)
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    # --- ward results ---
+
+    def ward_state(self, district_id, ulb_id, ward):
+        """'pending', 'counting' or 'declared', stable per ward (and advancing over time with --counting-seconds)."""
+        rng = random.Random(f"{self.seed}:{district_id}:{ulb_id}:{ward}")
+        if self.counting_seconds:
+            declare_at = rng.uniform(0, self.counting_seconds)
+            elapsed = time.monotonic() - self.started
+            if elapsed >= declare_at:
+                return 'declared'
+            return 'counting' if elapsed >= declare_at / 2 else 'pending'
+        roll = rng.random()
+        if roll < self.pending_ratio:
+            return 'pending'
+        if roll < self.pending_ratio + self.counting_ratio:
+            return 'counting'
+        return 'declared'
+
+    def ward_votes(self, district_id, ulb_id, ward):
+        """(rng, votes per candidate, index of the winner); the rng goes on to draw the summary row."""
+        rng = random.Random(f"{self.seed}:{district_id}:{ulb_id}:{ward}:votes")
+        count = rng.randint(3, 8)
+        votes = [rng.randint(40, 1400) for _ in range(count)]
+        return rng, votes, max(range(count), key=lambda i: votes[i])
+
+    def candidate_name(self, district_id, ulb_id, ward, index):
+        return f"CANDIDATE {chr(65 + index)} {district_id}-{ulb_id}-{ward}"
+
+    def expected(self, district_id, ulb_id, ward):
+        """(status, winner's name) the scraper should report for a ward right now: the ground truth."""
+        if self.ward_state(district_id, ulb_id, ward) != 'declared':
+            return 'Pending', None
+        _, _, winner = self.ward_votes(district_id, ulb_id, ward)
+        return 'Declared', self.candidate_name(district_id, ulb_id, ward, winner)
+
+    def ward_rows(self, district_id, ulb_id, ward, state):
+        """The summary row and candidate rows of one ward's results."""
+        rng, votes, winner = self.ward_votes(district_id, ulb_id, ward)
+        count = len(votes)
+        rows = []
+        for i in range(count):
+            status = ('Elected' if i == winner else 'Lost') if state == 'declared' else ''
+            rows.append(
+                f'\t<tr style="color:#333333;background-color:{"#F7F6F3" if i % 2 else "White"};">\n'
+                f'\t\t<td align="center">{i + 1}</td><td>{self.candidate_name(district_id, ulb_id, ward, i)}</td>'
+                f'<td align="center">{PARTIES[(i + ward) % len(PARTIES)]}</td><td align="right">{votes[i]}</td>'
+                f'<td align="center"><span style="font-weight:bold;">{status}</span></td>\n\t</tr>'
+            )
+        valid = sum(votes)
+        return (
+            '\t<tr style="background-color:#E2DED6;font-weight:bold;">\n'
+            f'\t\t<td colspan="5">Total Voters in Municipality Ward : {valid * 2 + 311}, Total Vaild Votes : {valid}, '
+            f'Rejected Votes : {rng.randint(3, 40)}, NOTA Votes : {rng.randint(3, 40)}, Reserved for : BC General</td>\n\t</tr>\n'
+            + '\n'.join(rows)
+        )
+
+    def results_table(self, body):
+        return (
+            '<table cellspacing="0" cellpadding="4" rules="all" border="1" id="GridView1" style="color:#333333;width:100%;border-collapse:collapse;">\n'
+            '\t<tr style="color:White;background-color:#5D7B9D;font-weight:bold;">\n'
+            '\t\t<th scope="col">Sl No</th><th scope="col">Candidate Name</th><th scope="col">Party</th>'
+            '<th scope="col">Votes Polled</th><th scope="col">Status</th>\n\t</tr>\n'
+            + body + '\n</table>'
+        )
+
+    def ward_table(self, district_id, ulb_id, ward, state):
+        return self.results_table(self.ward_rows(district_id, ulb_id, ward, state))
+
+    def bulk_table(self, district_id, ulb_id):
+        """Every ward of the ULB with results, or None while none has any."""
+        blocks = []
+        for ward in range(1, self.ward_count(district_id, ulb_id) + 1):
+            state = self.ward_state(district_id, ulb_id, ward)
+            if state != 'pending':
+                blocks.append(
+                    f'\t<tr style="background-color:#5D7B9D;color:White;">\n\t\t<td colspan="5">Ward No : {ward}</td>\n\t</tr>\n'
+                    + self.ward_rows(district_id, ulb_id, ward, state)
+                )
+        return self.results_table('\n'.join(blocks)) if blocks else None
+
+    def render(self, token, table='', message=''):
+        return PAGE.format(nav=NAV, districts=DISTRICTS, ulbs=ULBS, token_field=TOKEN_FIELD,
+                           token=token, table=table, message=message).encode('utf-8')
+
+
+class FakeTsecHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real portal
+    server_version = 'Apache-Coyote/1.1'
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.fake.count("connections")
+
+    def send_body(self, body, status=200, content_type='text/html;charset=UTF-8'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/__stats':
+            self.send_body(json.dumps(self.fake.stats).encode(), content_type='application/json')
+            return
+        self.fake.count("get")
+        self.fake.delay()
+        if self.fake.should_fail():
+            self.fake.count("server_errors")
+            self.send_body(b'<html><body><h1>HTTP Status 503</h1></body></html>', status=503)
+            return
+        self.send_body(self.fake.render(self.fake.issue_token()))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode('utf-8', 'replace')).items()}
+        if self.path == '/__reset':
+            self.fake.reset_stats()
+            self.send_body(b'{}', content_type='application/json')
+            return
+
+        self.fake.count("post")
+        self.fake.delay()
+        if self.fake.should_fail():
+            self.fake.count("server_errors")
+            self.send_body(b'<html><body><h1>HTTP Status 500 - Internal Server Error</h1></body></html>', status=500)
+            return
+
+        next_token = self.fake.issue_token()
+        if not self.fake.accept_token(form.get(TOKEN_FIELD, '')):
+            self.fake.count("token_rejections")
+            self.send_body(self.fake.render(next_token, message='<p class="error">Invalid token. Please try again.</p>'))
+            return
+
+        district_id = form.get('property(district_id)', '')
+        ulb_id = form.get('property(ulb_id)', '')
+        if form.get('property(ward_id)', '') in self.fake.bulk_ward_ids:
+            table = self.fake.bulk_table(district_id, ulb_id)
+            self.fake.count("bulk_pages")
+            self.send_body(self.fake.render(next_token, table=table or '',
+                                            message='' if table else '<p class="info">Results not yet declared.</p>'))
+            return
+        try:
+            ward = int(form.get('property(ward_id)', ''))
+        except ValueError:
+            ward = 0
+        if not 1 <= ward <= self.fake.ward_count(district_id, ulb_id):
+            self.fake.count("pending_pages")
+            self.send_body(self.fake.render(next_token, message='<p class="info">Please select a valid ward.</p>'))
+            return
+
+        state = self.fake.ward_state(district_id, ulb_id, ward)
+        if state == 'pending':
+            self.fake.count("pending_pages")
+            self.send_body(self.fake.render(next_token, message='<p class="info">Results not yet declared for the selected ward.</p>'))
+            return
+        self.fake.count("result_pages")
+        self.send_body(self.fake.render(next_token, table=self.fake.ward_table(district_id, ulb_id, ward, state)))
+
+
+def serve(fake, host='127.0.0.1', port=0):
+    """Starts the fake portal on a daemon thread and returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), FakeTsecHandler)
+    server.daemon_threads = True
+    server.fake = fake
+    threading.Thread(target=server.serve_forever, name="fake-tsec", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/knowPRUrban.se"
+
+
+def parse_range(text):
+    low, _, high = text.partition(':')
+    return float(low), float(high or low)
+
+
+def parse_ulb(text):
+    district_id, ulb_id, wards = text.split(':')
+    return (district_id, ulb_id), int(wards)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="0 picks a free port")
+    parser.add_argument("--wards", type=int, default=36, help="wards per ULB unless --ulb says otherwise")
+    parser.add_argument("--ulb", type=parse_ulb, action="append", default=[], metavar="D:U:WARDS")
+    parser.add_argument("--latency", type=parse_range, default=(0.0, 0.0), metavar="MIN:MAX", help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 5xx")
+    parser.add_argument("--token-ttl", type=float, default=0.0, help="seconds a token stays valid (0 = forever)")
+    parser.add_argument("--token-uses", type=int, default=0, help="POSTs a token is valid for (0 = unlimited)")
+    parser.add_argument("--pending-ratio", type=float, default=0.2, help="fraction of wards without a results table")
+    parser.add_argument("--counting-ratio", type=float, default=0.2, help="fraction of wards with votes but no winner yet")
+    parser.add_argument("--counting-seconds", type=float, default=0.0,
+                        help="instead of fixed ratios, declare every ward at a random time within this many seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--bulk-ward-id", action="append", default=[], metavar="VALUE",
+                        help="ward_id value answered with a consolidated page of every ward (repeatable)")
+    args = parser.parse_args()
+
+    fake = FakeTsec(wards=args.wards, ulbs=dict(args.ulb), latency=args.latency, error_rate=args.error_rate,
+                    token_ttl=args.token_ttl, token_uses=args.token_uses, pending_ratio=args.pending_ratio,
+                    counting_ratio=args.counting_ratio, counting_seconds=args.counting_seconds, seed=args.seed,
+                    bulk_ward_ids=args.bulk_ward_id)
+    server, url = serve(fake, args.host, args.port)
+    print(f"Fake TSEC listening on {url}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
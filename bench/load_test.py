@@ -0,0 +1,207 @@
+"""
+Concurrent-viewer load test for the Streamlit dashboard.
+
+Serves the fake TSEC portal (bench/fake_tsec.py) in-process, then opens
+--viewers simulated phones. Each viewer is its own Streamlit session driven
+headlessly by streamlit.testing.v1.AppTest, and all of them share the
+process's single poller, like browser sessions on one server. Every viewer
+opens the page, then --rounds times: Refresh, Details on a random ward, Back.
+
+AppTest is not thread-safe, so the viewers' actions are interleaved in one
+thread (every viewer refreshes, then every viewer opens a ward, ...). Script
+runs are CPU-bound and serialised by the GIL on a real server too, so the
+actions per second reported is the instance's capacity: divide it by the
+actions per second one phone generates to get a viewer count.
+
+Reports:
+
+  actions   - script run time per action (p50/p95/max) and actions per second
+  sections  - time per page section, from the dashboard_section_seconds metric
+              (party tally, party table and chart, ward grid, ward detail,
+              candidate table)
+  memory    - peak Python heap (tracemalloc) while the viewers run, AppTest's
+              own allocations included
+  upstream  - requests sent to the portal and poller cycles while the viewers
+              run; these must not grow with --viewers
+
+Times are server-side script time (building the page), not browser
+rendering. tracemalloc slows Python down; pass --no-memory for clean timings.
+
+    python bench/load_test.py --viewers 20 --rounds 3
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import fake_tsec
+
+SECTIONS = ["results_panel", "party_tally", "party_chart", "ward_grid", "ward_detail", "candidate_table"]
+ACTIONS = ["open", "refresh", "details", "back"]
+
+
+def write_targets(args):
+    targets = {
+        "year": "2026",
+        "election_id": "190",
+        "targets": [
+            {"district_id": "99", "district": "Bench", "ulb_id": str(u), "name": f"ULB {u}", "wards": args.wards}
+            for u in range(1, args.ulbs + 1)
+        ],
+    }
+    fd, path = tempfile.mkstemp(suffix=".json", prefix="tsec-load-")
+    with os.fdopen(fd, "w") as f:
+        json.dump(targets, f)
+    return path
+
+
+def button(at, label):
+    return next(b for b in at.button if label in b.label)
+
+
+class Viewer:
+    """One phone: its own session, clicking Refresh, Details and Back."""
+
+    def __init__(self, app, seed, timings, errors):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(app, default_timeout=120)
+        self.rng = random.Random(seed)
+        self.timings = timings
+        self.errors = errors
+
+    def _timed(self, action, step):
+        started = time.perf_counter()
+        try:
+            self.at = step()
+        except Exception as e:
+            self.errors.append(f"{action}: {e!r}")
+            return
+        self.timings[action].append(time.perf_counter() - started)
+        if self.at.exception:
+            self.errors.append(f"{action}: {self.at.exception[0].message}")
+
+    def open(self):
+        self._timed("open", self.at.run)
+
+    def refresh(self):
+        self._timed("refresh", lambda: button(self.at, "Refresh").click().run())
+
+    def details(self):
+        wards = [b.key for b in self.at.button if b.key and b.key.startswith("btn_")]
+        self._timed("details", lambda: self.at.button(key=self.rng.choice(wards)).click().run())
+
+    def back(self):
+        self._timed("back", lambda: button(self.at, "Back").click().run())
+
+
+def section_totals(metrics):
+    totals = {}
+    for name in SECTIONS:
+        child = metrics.SECTION_SECONDS.labels(section=name)
+        totals[name] = (child.count, child.sum)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--viewers", type=int, default=10, help="simulated phones (sessions)")
+    parser.add_argument("--rounds", type=int, default=3, help="Refresh / Details / Back rounds per viewer")
+    parser.add_argument("--app", default="dashboard.py", help="app to test (dashboard.py or tg_polls.py)")
+    parser.add_argument("--ulbs", type=int, default=1)
+    parser.add_argument("--wards", type=int, default=36, help="wards per ULB")
+    parser.add_argument("--latency", type=fake_tsec.parse_range, default=(0.01, 0.05), metavar="MIN:MAX",
+                        help="fake portal latency in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (faster, cleaner timings)")
+    args = parser.parse_args()
+
+    fake = fake_tsec.FakeTsec(wards=args.wards, latency=args.latency, seed=args.seed)
+    server, base_url = fake_tsec.serve(fake)
+    db_dir = tempfile.mkdtemp(prefix="tsec-load-")
+    os.environ.update({
+        "TSEC_TARGETS": write_targets(args),
+        "TSEC_BASE_URL": base_url,
+        "TSEC_DB_PATH": os.path.join(db_dir, "results.sqlite3"),
+        "TSEC_ARCHIVE_PATH": "",  # Fake pages must not reach the page archive
+    })
+    os.chdir(ROOT_DIR)
+
+    from streamlit.testing.v1 import AppTest
+    import metrics
+
+    app = os.path.join(ROOT_DIR, args.app)
+    try:
+        # Warm-up session: starts the shared poller and waits for a complete first crawl
+        warm = AppTest.from_file(app, default_timeout=120).run()
+        deadline = time.monotonic() + 120
+        while any("wards to go" in c.value for c in warm.caption) and time.monotonic() < deadline:
+            time.sleep(0.5)
+            warm.run()
+        if warm.exception:
+            sys.exit(f"app failed: {warm.exception[0].message}")
+
+        before_stats = dict(fake.stats)
+        before_cycles = metrics.CYCLE_SECONDS.labels().count
+        before_sections = section_totals(metrics)
+        if not args.no_memory:
+            tracemalloc.start()
+
+        timings = {action: [] for action in ACTIONS}
+        errors = []
+        started = time.perf_counter()
+        viewers = [Viewer(app, args.seed + i, timings, errors) for i in range(args.viewers)]
+        for step in [Viewer.open] + [Viewer.refresh, Viewer.details, Viewer.back] * args.rounds:
+            for one in viewers:
+                step(one)
+        wall = time.perf_counter() - started
+
+        peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+        tracemalloc.stop()
+        after_sections = section_totals(metrics)
+        cycles = metrics.CYCLE_SECONDS.labels().count - before_cycles
+        requests = (fake.stats["get"] + fake.stats["post"]) - (before_stats["get"] + before_stats["post"])
+    finally:
+        server.shutdown()
+        os.unlink(os.environ["TSEC_TARGETS"])
+
+    total_actions = sum(len(t) for t in timings.values())
+    print(f"{args.viewers} viewers x {args.rounds} rounds on {args.app}, {args.ulbs} ULB(s) x {args.wards} wards: "
+          f"{total_actions} actions in {wall:.1f}s ({total_actions / wall:.1f}/s)\n")
+
+    print(f"{'action':<16} {'runs':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for action in ACTIONS:
+        samples = sorted(timings[action])
+        if not samples:
+            continue
+        p95 = statistics.quantiles(samples, n=20, method='inclusive')[-1] if len(samples) > 1 else samples[0]
+        print(f"{action:<16} {len(samples):>6} {statistics.median(samples) * 1e3:>8.1f} {p95 * 1e3:>8.1f} {samples[-1] * 1e3:>8.1f}")
+
+    print(f"\n{'section':<16} {'runs':>6} {'mean ms':>8} {'total s':>8}")
+    for name in SECTIONS:
+        count = after_sections[name][0] - before_sections[name][0]
+        total = after_sections[name][1] - before_sections[name][1]
+        if count:
+            print(f"{name:<16} {count:>6} {total / count * 1e3:>8.1f} {total:>8.2f}")
+
+    print()
+    if peak is not None:
+        print(f"peak traced memory while viewing: {peak / 2 ** 20:.1f} MiB")
+    print(f"upstream while viewing: {requests} requests to the portal, {cycles} poller cycle(s)")
+    if errors:
+        print(f"\n{len(errors)} error(s), first: {errors[0]}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
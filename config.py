@@ -0,0 +1,71 @@
+import json
+import os
+from collections import namedtuple
+
+# --- TARGET CONFIGURATION ---
+# Which municipalities (ULBs) to track is read from a JSON file so that one
+# deployment can follow any number of ULBs across districts. See targets.json.
+TARGETS_FILE = os.environ.get("TSEC_TARGETS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "targets.json"))
+
+
+class Target(namedtuple("Target", ["district_id", "ulb_id", "name", "district", "wards", "year", "election_id"])):
+    """One ULB to crawl. Its wards are numbered 1..wards."""
+    __slots__ = ()
+
+    @property
+    def key(self):
+        return (self.district_id, self.ulb_id)
+
+    @property
+    def label(self):
+        return f"{self.name} ({self.district})"
+
+    def ward_keys(self):
+        return [(self.district_id, self.ulb_id, w) for w in range(1, self.wards + 1)]
+
+
+def load_config(path=None):
+    """
+    Reads the targets file. Returns (targets, settings) where settings holds
+    the top-level crawl options. `year` and `election_id` given at the top
+    level apply to every target that does not set its own.
+    """
+    with open(path or TARGETS_FILE, encoding="utf-8") as f:
+        raw = json.load(f)
+
+    targets = []
+    for entry in raw.get("targets", []):
+        targets.append(Target(
+            district_id=str(entry["district_id"]),
+            ulb_id=str(entry["ulb_id"]),
+            name=entry.get("name", f"ULB {entry['ulb_id']}"),
+            district=entry.get("district", f"District {entry['district_id']}"),
+            wards=int(entry["wards"]),
+            year=str(entry.get("year", raw.get("year"))),
+            election_id=str(entry.get("election_id", raw.get("election_id"))),
+        ))
+    if not targets:
+        raise ValueError(f"No targets configured in {path or TARGETS_FILE}")
+
+    keys = [t.key for t in targets]
+    if len(set(keys)) != len(keys):
+        raise ValueError("Duplicate (district_id, ulb_id) in targets")
+
+    settings = {
+        "wards_per_cycle": int(raw.get("wards_per_cycle", 0)),
+        # Per-host request pacing (see ratelimit.py)
+        "requests_per_second": float(raw.get("requests_per_second", 8)),
+        "request_burst": int(raw.get("request_burst", 8)),
+        "initial_in_flight": int(raw.get("initial_in_flight", 4)),
+        "min_in_flight": int(raw.get("min_in_flight", 1)),
+        "max_in_flight": int(raw.get("max_in_flight", 16)),
+        "latency_target": float(raw.get("latency_target", 5.0)),
+        # Circuit breaker around the portal
+        "breaker_failures": int(raw.get("breaker_failures", 5)),
+        "breaker_reset_timeout": float(raw.get("breaker_reset_timeout", 30)),
+    }
+    return targets, settings
+
+
+TARGETS, SETTINGS = load_config()
+TARGETS_BY_KEY = {t.key: t for t in TARGETS}
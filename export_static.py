@@ -0,0 +1,196 @@
+import argparse
+import html
+import json
+import logging
+import os
+import tempfile
+
+import analytics
+import api
+from config import TARGETS
+from poller import Poller
+from store import SnapshotStore
+
+logger = logging.getLogger(__name__)
+
+# --- STATIC EXPORT ---
+# Headless alternative to the dashboard for CDN hosting. The shared poller
+# crawls TSEC as usual and, after every published snapshot, this writes:
+#
+#   <out>/index.html                                  list of ULBs
+#   <out>/<district_id>-<ulb_id>/index.html           summary, party tally, ward grid
+#   <out>/<district_id>-<ulb_id>/ward-<n>.html        candidate table
+#   <out>/api/ulbs.json, <out>/api/ulbs/<d>/<u>.json, <out>/api/ulbs/<d>/<u>/wards/<n>.json
+#                                                     the same JSON as the results API
+#   <out>/status.json                                 snapshot version and time
+#
+# Every file is replaced atomically and only when its bytes change, so
+# unchanged pages keep their CDN cache entries. Only status.json changes on
+# every cycle.
+EXPORT_DIR = os.environ.get("TSEC_EXPORT_DIR", "site")
+
+STYLE = """body{font-family:system-ui,sans-serif;margin:1rem;max-width:60rem}
+.grid{display:grid;grid-template-columns:repeat(auto-fill,minmax(10rem,1fr));gap:.5rem}
+.card{border:1px solid #ddd;border-radius:.5rem;padding:.5rem}
+.Declared{background:#d1e7dd}.Pending{background:#fff3cd}.Error{background:#f8d7da}
+table{border-collapse:collapse}td,th{border:1px solid #ddd;padding:.25rem .5rem;text-align:left}
+.won{font-weight:bold;background:#d1e7dd}a{color:inherit}"""
+
+
+def write_if_changed(path, data):
+    """Atomically replaces `path` with `data` unless it already holds exactly that. Returns True if written."""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return True
+
+
+# --- HTML ---
+
+def _page(title, body):
+    return (
+        "<!DOCTYPE html>\n<html lang=\"en\"><head><meta charset=\"utf-8\">"
+        "<meta name=\"viewport\" content=\"width=device-width,initial-scale=1\">"
+        f"<title>{html.escape(title)}</title><style>{STYLE}</style></head>"
+        f"<body>{body}</body></html>\n"
+    ).encode('utf-8')
+
+def _ulb_dir(target):
+    return f"{target.district_id}-{target.ulb_id}"
+
+def render_index():
+    links = "".join(
+        f"<li><a href=\"{_ulb_dir(t)}/\">{html.escape(t.label)}</a></li>" for t in TARGETS
+    )
+    return _page("Municipal Election Results", f"<h1>Municipal Election Results</h1><ul>{links}</ul>")
+
+def render_ulb(target, wards, model):
+    e = html.escape
+    declared = sum(1 for w in wards if w['status'] == 'Declared')
+    pending = sum(1 for w in wards if w['status'] == 'Pending')
+    parts = [
+        f"<h1>{e(target.name)} Election</h1>",
+        f"<p>{e(target.district)} District | Municipal Results {e(target.year)}</p>",
+        f"<p><b>Declared</b> {declared} &middot; <b>Pending</b> {pending}</p>",
+        "<h2>Party Wise Performance</h2>",
+    ]
+    tally = model.seat_tally(target.key)
+    if len(tally):
+        rows = "".join(f"<tr><td>{e(party)}</td><td>{seats}</td></tr>" for party, seats in zip(tally['Party'], tally['Wards Won']))
+        parts.append(f"<table><tr><th>Party</th><th>Seats Won</th></tr>{rows}</table>")
+    else:
+        parts.append("<p>Waiting for results to be declared.</p>")
+
+    parts.append("<h2>Wards Overview</h2><div class=\"grid\">")
+    for item in wards:
+        status = item['status']
+        css = 'Error' if status == 'Connection Error' else status
+        winner = item.get('winner')
+        detail = f"<br><b>{e(winner['Candidate Name'])}</b><br>{e(winner['Party'])}" if status == 'Declared' and winner else ""
+        parts.append(
+            f"<div class=\"card {css}\"><a href=\"ward-{item['ward']}.html\">Ward {item['ward']}</a>"
+            f"<br>{'WON' if status == 'Declared' else e(status)}{detail}</div>"
+        )
+    parts.append("</div>")
+    return _page(f"{target.name} Election Results", "".join(parts))
+
+def render_ward(target, item):
+    e = html.escape
+    summary = item.get('summary', {})
+    parts = [
+        f"<p><a href=\"./\">&larr; {e(target.name)}</a></p>",
+        f"<h1>Ward {item['ward']} Report</h1>",
+        "<p>"
+        f"Total Voters: {e(summary.get('Total Voters in Municipality Ward', '-'))} &middot; "
+        f"Valid Votes: {e(summary.get('Total Vaild Votes', '-'))} &middot; "
+        f"Reserved For: {e(summary.get('Reserved for', '-'))} &middot; "
+        f"Rejected/NOTA: {e(summary.get('Rejected Votes', '0'))} / {e(summary.get('NOTA Votes', '0'))}"
+        "</p>",
+        "<h2>Candidate Table</h2>",
+    ]
+    if item['candidates']:
+        rows = "".join(
+            f"<tr class=\"{'won' if 'Elected' in c['Status'] else ''}\"><td>{e(c['Sl No'])}</td><td>{e(c['Candidate Name'])}</td>"
+            f"<td>{e(c['Party'])}</td><td>{c['Votes']}</td><td>{e(c['Status'])}</td></tr>"
+            for c in item['candidates']
+        )
+        parts.append(f"<table><tr><th>No.</th><th>Candidate Name</th><th>Party</th><th>Votes</th><th>Status</th></tr>{rows}</table>")
+    else:
+        parts.append("<p>No detailed candidate data available yet.</p>")
+    return _page(f"{target.name} Ward {item['ward']}", "".join(parts))
+
+
+# --- EXPORT ---
+
+def export(poller, out_dir=EXPORT_DIR):
+    """Writes every page and JSON file for the poller's latest snapshot. Returns how many files changed."""
+    snapshot = poller.latest()
+    if snapshot is None:
+        return 0
+    results = api.ResultsApi(poller)
+    model = analytics.for_snapshot(snapshot)
+    files = {
+        "index.html": render_index(),
+        "status.json": json.dumps({"version": snapshot.version, "fetched_at": snapshot.fetched_at}).encode('utf-8'),
+        "api/ulbs.json": results.resource("/api/ulbs", snapshot)[2],
+    }
+    for target in TARGETS:
+        wards = snapshot.by_ulb.get(target.key, ())
+        route = f"api/ulbs/{target.district_id}/{target.ulb_id}"
+        files[f"{_ulb_dir(target)}/index.html"] = render_ulb(target, wards, model)
+        files[f"{route}.json"] = results.resource("/" + route, snapshot)[2]
+        for item in wards:
+            files[f"{_ulb_dir(target)}/ward-{item['ward']}.html"] = render_ward(target, item)
+            files[f"{route}/wards/{item['ward']}.json"] = results.resource(f"/{route}/wards/{item['ward']}", snapshot)[2]
+
+    written = sum(write_if_changed(os.path.join(out_dir, name), data) for name, data in files.items())
+    logger.info("Exported snapshot %d: %d of %d files changed", snapshot.version, written, len(files))
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl TSEC headlessly and export static results pages after every cycle.")
+    parser.add_argument("--out", default=EXPORT_DIR, help="output directory (default: %(default)s)")
+    parser.add_argument("--once", action="store_true", help="run a single cycle, export it and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    poller = Poller(store=SnapshotStore())
+    if args.once:
+        try:
+            poller.run_once()
+            export(poller, args.out)
+        finally:
+            poller.release_leases()
+        return
+
+    poller.start()
+    version = 0
+    try:
+        while True:
+            snapshot = poller.wait_for_version(version)
+            if snapshot.version > version:
+                export(poller, args.out)
+                version = snapshot.version
+    except KeyboardInterrupt:
+        poller.stop()
+        # The polling thread is a daemon and may not get to release them before exit
+        poller.release_leases()
+
+
+if __name__ == "__main__":
+    main()
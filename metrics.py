@@ -0,0 +1,253 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- METRICS ---
+# A deliberately small, dependency-free subset of the Prometheus client:
+# counters, gauges and histograms with labels, rendered in the text
+# exposition format and served from a local HTTP endpoint.
+
+METRICS_PORT = int(os.environ.get("TSEC_METRICS_PORT", "0"))  # 0 disables the /metrics endpoint
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self.labels()  # unlabelled metrics are exported as 0 before first use
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def _default(self):
+        """The unlabelled child, for metrics without labels."""
+        return self.labels()
+
+    def _label_text(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, child in children:
+            lines.extend(self._render_child(key, child))
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value):
+        with self._lock:
+            self.value = float(value)
+
+    def set_function(self, function):
+        """Reads the value from `function` at scrape time instead."""
+        self.function = function
+
+    def get(self):
+        return float(self.function()) if self.function else self.value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{self._label_text(key)} {child.get():g}"]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value):
+        self._default().set(value)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.counts):
+                self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _render_child(self, key, child):
+        with child._lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{self.name}_bucket{self._label_text(key, [('le', f'{bound:g}')])} {cumulative}")
+        lines.append(f"{self.name}_bucket{self._label_text(key, [('le', '+Inf')])} {count}")
+        lines.append(f"{self.name}_sum{self._label_text(key)} {total:g}")
+        lines.append(f"{self.name}_count{self._label_text(key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+def counter(name, help, labelnames=()):
+    return REGISTRY.register(Counter(name, help, labelnames))
+
+def gauge(name, help, labelnames=()):
+    return REGISTRY.register(Gauge(name, help, labelnames))
+
+def histogram(name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, help, labelnames, buckets))
+
+
+def timed(histogram, **labels):
+    """Decorator observing each call's wall time in `histogram` (with `labels`)."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with histogram.labels(**labels).time():
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# --- SCRAPER AND DASHBOARD METRICS ---
+
+REQUEST_SECONDS = histogram("tsec_request_seconds", "Latency of requests to TSEC.", ["kind"])
+REQUESTS = counter("tsec_requests_total", "Requests sent to TSEC by outcome.", ["kind", "outcome"])
+RETRIES = counter("tsec_retries_total", "Ward fetch attempts that failed and were retried.")
+PARSE_SECONDS = histogram("tsec_parse_seconds", "CPU time spent parsing a ward page.",
+                          buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+PARSE_CACHE = counter("tsec_parse_cache_total", "Ward pages served from the parse cache (hit) or parsed (miss).", ["result"])
+BULK_FETCHES = counter("tsec_bulk_fetches_total",
+                       "Consolidated ULB requests: used, unsupported (variant rejected) or error.", ["outcome"])
+DEADLINE_SKIPPED = counter("tsec_deadline_skipped_total", "Ward fetches abandoned at the cycle deadline.")
+WARD_RESULTS = counter("tsec_ward_results_total", "Ward fetch results by status.", ["status"])
+IN_FLIGHT = gauge("tsec_in_flight_requests", "Requests to TSEC currently in flight.")
+CONCURRENCY_LIMIT = gauge("tsec_concurrency_limit", "Current adaptive limit on in-flight requests.")
+CIRCUIT_OPEN = gauge("tsec_circuit_open", "1 while the circuit breaker refuses requests to TSEC.")
+CYCLE_SECONDS = histogram("poller_cycle_seconds", "Duration of a complete poll cycle.")
+CYCLE_WARDS = gauge("poller_cycle_wards", "Wards polled in the last cycle.")
+LEASED_ULBS = gauge("poller_leased_ulbs", "ULBs this replica holds the crawl lease for.")
+SNAPSHOT_VERSION = gauge("poller_snapshot_version", "Version of the latest published snapshot.")
+RETAINED_SNAPSHOTS = gauge("poller_retained_snapshots", "Snapshot versions still held for sessions and stream clients.")
+RERUNS = counter("dashboard_reruns_total", "Streamlit script runs.")
+RERUN_SECONDS = histogram("dashboard_rerun_seconds", "Wall time of Streamlit script runs that completed.")
+SECTION_SECONDS = histogram("dashboard_section_seconds", "Wall time spent building each part of the page.", ["section"])
+
+
+# --- HTTP ENDPOINT ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_server(port=METRICS_PORT, host="127.0.0.1"):
+    """
+    Serves /metrics on a daemon thread, once per process, and returns the
+    server (None when `port` is 0).
+    """
+    global _server
+    with _server_lock:
+        if _server is None and port:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        return _server
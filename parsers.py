@@ -0,0 +1,366 @@
+import hashlib
+import html
+import os
+import re
+import threading
+from html.parser import HTMLParser
+
+# --- PARSER BACKEND ---
+# "fast" only tokenises the GridView1 table with the standard library and stops
+# there, "lxml" uses lxml.html (optional dependency) and "bs4" is the original
+# full BeautifulSoup parse, kept as the reference implementation.
+PARSER_BACKEND = os.environ.get("TSEC_PARSER", "fast")
+
+TOKEN_FIELD = 'org.apache.struts.taglib.html.TOKEN'
+RESULTS_TABLE_ID = 'GridView1'
+
+# Row kinds produced by every backend
+SUMMARY = "summary"  # a row containing a colspan cell; value is the row text
+CELLS = "cells"      # any other row; value is the list of its <td> texts
+
+
+def rows_to_results(rows):
+    """
+    Turns backend rows (header row already dropped) into (summary, candidates).
+    This is the single place that knows the TSEC table layout.
+    """
+    summary_data = {}
+    candidate_rows = []
+
+    for kind, value in rows:
+        if kind == SUMMARY:
+            parts = value.split(',')
+            for part in parts:
+                if ':' in part:
+                    key, val = part.split(':', 1)
+                    summary_data[key.strip()] = val.strip()
+            continue
+
+        cells = value
+        if len(cells) >= 4:
+            candidate_rows.append({
+                "Sl No": cells[0],
+                "Candidate Name": cells[1],
+                "Party": cells[2],
+                "Votes": int(cells[3]) if cells[3].isdigit() else 0,
+                "Status": cells[4] if len(cells) > 4 else ""
+            })
+
+    return summary_data, candidate_rows
+
+
+# A colspan row made up of only a ward heading, e.g. "Ward No : 12"
+_WARD_HEADING_RE = re.compile(r'^Ward\s*(?:No\.?|Number)?\s*:?\s*(\d+)$', re.I)
+
+def split_ward_rows(rows):
+    """
+    Splits the rows of a consolidated (whole ULB) results table into
+    {ward: rows} at the ward heading rows, which are dropped so each ward's
+    rows look like a single-ward page. Returns None when the table is not
+    consolidated: no heading, rows before the first heading, or a ward twice.
+    """
+    blocks = {}
+    current = None
+    for kind, value in rows:
+        heading = _WARD_HEADING_RE.match(value.strip()) if kind == SUMMARY else None
+        if heading:
+            ward = int(heading.group(1))
+            if ward in blocks:
+                return None
+            current = blocks[ward] = []
+        elif current is None:
+            return None
+        else:
+            current.append((kind, value))
+    return blocks or None
+
+
+# --- BS4 BACKEND (reference) ---
+
+def _bs4_parse(content):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+    token_input = soup.find('input', attrs={'name': TOKEN_FIELD})
+    token = token_input.get('value') if token_input else None
+
+    table = soup.find('table', id=RESULTS_TABLE_ID)
+    if not table:
+        return None, token
+
+    rows = []
+    for row in table.find_all('tr')[1:]:
+        if row.find('td', attrs={'colspan': True}):
+            rows.append((SUMMARY, row.get_text(strip=True)))
+        else:
+            rows.append((CELLS, [cell.get_text(strip=True) for cell in row.find_all('td')]))
+    return rows, token
+
+
+# --- LXML BACKEND ---
+
+def _lxml_text(element):
+    return ''.join(t.strip() for t in element.xpath('.//text()[not(ancestor::script) and not(ancestor::style)]'))
+
+# Which elements may directly contain each table element; None is the top level
+_TABLE_PARENTS = {
+    'table': (None, 'td'),
+    'tbody': ('table',), 'thead': ('table',), 'tfoot': ('table',),
+    'tr': ('table', 'tbody', 'thead', 'tfoot'),
+    'td': ('tr',),
+}
+_TABLE_PART_RE = re.compile(r'<(/?)(' + '|'.join(_TABLE_PARENTS) + r')\b', re.I)
+
+def _well_nested(table):
+    """
+    True when every table element in the markup `table` is explicitly closed
+    inside its parent. libxml2 closes a <td> or <tr> when the next one opens,
+    while BeautifulSoup's html.parser nests them, so only well-nested tables
+    give the same rows in both.
+    """
+    stack = [None]
+    for tag in _TABLE_PART_RE.finditer(table):
+        name = tag.group(2).lower()
+        if tag.group(1):
+            if stack.pop() != name or not stack:
+                return False
+        elif stack[-1] in _TABLE_PARENTS[name]:
+            stack.append(name)
+        else:
+            return False
+    return stack == [None]
+
+def _lxml_parse(content):
+    import lxml.html
+
+    table = _slice_table(_decode(content))
+    if table is not None and not _well_nested(table):
+        # Only the reference's own nesting gives its rows for such a table
+        return _fast_parse(content)
+
+    doc = lxml.html.fromstring(content)
+    token_inputs = doc.xpath('//input[@name=$name]', name=TOKEN_FIELD)
+    token = token_inputs[0].get('value') if token_inputs else None
+
+    tables = doc.xpath('//table[@id=$id]', id=RESULTS_TABLE_ID)
+    if not tables:
+        return None, token
+
+    rows = []
+    for row in tables[0].xpath('.//tr')[1:]:
+        if row.xpath('.//td[@colspan]'):
+            rows.append((SUMMARY, _lxml_text(row)))
+        else:
+            rows.append((CELLS, [_lxml_text(cell) for cell in row.xpath('.//td')]))
+    return rows, token
+
+
+# --- FAST BACKEND (standard library, table only) ---
+
+_TABLE_START_RE = re.compile(r'<table\b[^>]*?(?<![\w-])id\s*=\s*(["\']?)' + RESULTS_TABLE_ID + r'\1(?=[\s/>])[^>]*>', re.I)
+_TABLE_TAG_RE = re.compile(r'<(/?)table\b[^>]*>', re.I)
+_ATTR_RE = re.compile(r'([^\s=/>]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))')
+
+
+def _decode(content):
+    if isinstance(content, str):
+        return content
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError:
+        return content.decode('cp1252', errors='replace')
+
+def _fast_token(text):
+    pos = text.find(TOKEN_FIELD)
+    while pos != -1:
+        start = text.rfind('<', 0, pos)
+        end = text.find('>', pos)
+        tag = text[start:end + 1]
+        if start != -1 and end != -1 and tag[:6].lower() == '<input':
+            attrs = {m.group(1).lower(): next(g for g in m.groups()[1:] if g is not None) for m in _ATTR_RE.finditer(tag)}
+            if attrs.get('name') == TOKEN_FIELD and 'value' in attrs:
+                return html.unescape(attrs['value'])
+        pos = text.find(TOKEN_FIELD, pos + 1)
+    return None
+
+def _slice_table(text):
+    """Returns the GridView1 table markup, including nested tables, or None."""
+    start = _TABLE_START_RE.search(text)
+    if not start:
+        return None
+    depth = 0
+    for tag in _TABLE_TAG_RE.finditer(text, start.start()):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            return text[start.start():tag.end()]
+    return text[start.start():]
+
+
+# Elements BeautifulSoup's html.parser builder never leaves open
+_VOID_TAGS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta',
+    'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+    'nextid', 'spacer',
+])
+
+
+class _TableRowParser(HTMLParser):
+    """
+    Collects row and cell texts the way BeautifulSoup's get_text(strip=True)
+    and recursive find_all('tr')/find_all('td') would see them. As with
+    BeautifulSoup's html.parser builder, an end tag also closes every element
+    left open inside it, so `</tr>` ends that row's unclosed cells.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []         # [has_colspan, text_parts, cells] in document order
+        self._open_rows = []
+        self._open_cells = []  # text part lists of the currently open cells
+        self._open_tags = []   # names of the open elements, innermost last
+        self._skip = 0         # inside <script>/<style>
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _VOID_TAGS:
+            return
+        self._open_tags.append(tag)
+        if tag == 'tr':
+            row = [False, [], []]
+            self.rows.append(row)
+            self._open_rows.append(row)
+        elif tag == 'td':
+            cell = []
+            for row in self._open_rows:
+                row[2].append(cell)
+                if any(name == 'colspan' for name, _ in attrs):
+                    row[0] = True
+            self._open_cells.append(cell)
+        elif tag in ('script', 'style'):
+            self._skip += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in self._open_tags:
+            return
+        while True:
+            closed = self._open_tags.pop()
+            if closed == 'tr':
+                self._open_rows.pop()
+            elif closed == 'td':
+                self._open_cells.pop()
+            elif closed in ('script', 'style'):
+                self._skip -= 1
+            if closed == tag:
+                return
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        data = data.strip()
+        if not data:
+            return
+        for row in self._open_rows:
+            row[1].append(data)
+        for cell in self._open_cells:
+            cell.append(data)
+
+def _fast_parse(content):
+    text = _decode(content)
+    token = _fast_token(text)
+
+    table = _slice_table(text)
+    if table is None:
+        return None, token
+
+    parser = _TableRowParser()
+    parser.feed(table)
+    parser.close()
+
+    rows = []
+    for has_colspan, parts, cells in parser.rows[1:]:
+        if has_colspan:
+            rows.append((SUMMARY, ''.join(parts)))
+        else:
+            rows.append((CELLS, [''.join(cell) for cell in cells]))
+    return rows, token
+
+
+BACKENDS = {
+    "fast": _fast_parse,
+    "lxml": _lxml_parse,
+    "bs4": _bs4_parse,
+}
+
+
+def parse_page(content, backend=None):
+    """
+    Parses a TSEC page with the configured backend.
+    Returns (rows, token): rows is None when the page has no results table.
+    """
+    name = backend or PARSER_BACKEND
+    try:
+        parse = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown parser backend: {name}") from None
+    return parse(content)
+
+def extract_token(content):
+    """Reads only the Struts token from a page, without touching the results table."""
+    return _fast_token(_decode(content))
+
+
+# --- PARSE CACHE ---
+
+def page_digest(content, token=None):
+    """Hash of a page body with its volatile Struts token blanked out."""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    if token:
+        content = content.replace(token.encode('utf-8'), b'')
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+
+class ParseCache:
+    """
+    Remembers, per ward, the digest of the last page parsed and its result.
+
+    Most polls of an open ward return the same page, so a matching digest
+    lets the caller reuse the previous result instead of parsing again. The
+    counters show how often that happens and roughly how much parse CPU it
+    saved (hits times the average CPU cost of a miss).
+    """
+
+    def __init__(self):
+        self._entries = {}  # ward key -> (digest, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.parse_seconds = 0.0  # CPU spent parsing on misses
+
+    def get(self, key, digest):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == digest:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, digest, result, parse_seconds):
+        with self._lock:
+            self._entries[key] = (digest, result)
+            self.parse_seconds += parse_seconds
+
+    def stats(self):
+        with self._lock:
+            average = self.parse_seconds / self.misses if self.misses else 0.0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "parse_seconds": self.parse_seconds,
+                "saved_seconds": self.hits * average,
+            }
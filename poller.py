@@ -0,0 +1,404 @@
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+import metrics
+from config import SETTINGS
+from scheduler import PriorityScheduler
+from scraper import all_ward_keys, fetch_all_data, parse_cache_stats, ward_key
+
+logger = logging.getLogger(__name__)
+
+# --- POLLER CONFIGURATION ---
+POLL_INTERVAL = 60  # Seconds between the start of two scrape cycles
+FREEZE_CONFIRMATIONS = 2   # Identical "Declared" polls needed before a ward stops being polled
+REVERIFY_INTERVAL = 600    # Seconds before a frozen ward is polled again to catch corrections (0 disables)
+REVERIFY_PER_CYCLE = 2     # Frozen wards re-verified per cycle at most
+CYCLE_DEADLINE = 45        # Seconds after which wards still being fetched keep their last known result
+PUBLISH_INTERVAL = 1.0     # Seconds between progressive snapshots published during a cycle
+RETAIN_SECONDS = 300       # Seconds a superseded snapshot stays available after it was last read
+LEASE_TTL = 3 * POLL_INTERVAL  # Seconds a replica keeps crawling a ULB without renewing its lease
+# Lease owner name; set it per replica so a restarted replica takes its leases straight back
+REPLICA_ID = os.environ.get("TSEC_REPLICA_ID") or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# An immutable, versioned view of one completed scrape cycle.
+# `wards` is a tuple of every per-ward dict sorted by ward key and `by_ulb`
+# maps (district_id, ulb_id) to that ULB's wards; readers must treat them as read-only.
+# A ward that did not change between two versions is the very same dict in both.
+# `pending` counts the wards of the running cycle not fetched yet (0 once it is complete).
+Snapshot = namedtuple("Snapshot", ["version", "fetched_at", "duration", "wards", "by_ulb", "pending"])
+
+
+def failed_poll(result, previous):
+    """
+    True when `result` says nothing about the ward: a Connection Error, or a
+    page without a results table (Pending, no candidates) for a ward already
+    Declared, such as a token rejection or portal error page. TSEC never
+    withdraws a declared result that way, so the previous result is kept.
+    """
+    if result['status'] == 'Connection Error':
+        return True
+    return (result['status'] == 'Pending' and not result.get('candidates')
+            and previous is not None and previous['status'] == 'Declared')
+
+
+class Poller:
+    """
+    Owns the scrape schedule for the whole process.
+
+    A single daemon thread runs `fetch` every `interval` seconds and publishes
+    the result as a new Snapshot. Viewers only ever call `latest()`, which is
+    a plain attribute read and never touches the network.
+
+    Wards are identified by (district_id, ulb_id, ward) keys. A ward that
+    returns the same "Declared" result `freeze_after` polls in a row is
+    frozen: later cycles only fetch open wards, handed out by `scheduler`
+    (by default polling changing and viewed wards every cycle and backing
+    off quiet ones, see scheduler.py), plus a few frozen ones whose last
+    check is older than `reverify_interval`. `note_interest()` tells the
+    scheduler which wards viewers are looking at.
+
+    With a `store`, every change is persisted and `start()` first publishes
+    the last stored results, so a restarted process serves data immediately
+    while the first crawl runs in the background.
+
+    A failed poll (see failed_poll) never replaces a good result: the ward keeps its last good
+    result, published with `stale=True` and `updated_at` (when it was last
+    fetched successfully) until a poll succeeds again.
+
+    Results are published as they arrive: during a cycle a new Snapshot
+    (with `pending` > 0) comes out at most every `publish_interval` seconds,
+    so the fastest wards are visible first. A cycle that changed no ward
+    publishes nothing and the version stays the same. Wards still unfinished after
+    `cycle_deadline` seconds are abandoned for this cycle and keep their last
+    known result.
+
+    Several replicas can share one store. Each cycle, a replica only crawls
+    the ULBs whose lease it holds (one lease per ULB, renewed every cycle and
+    expiring after `lease_ttl`) and reads everything else from the rows the
+    lease holders wrote, so each ULB is crawled by exactly one replica and
+    all replicas serve the same results.
+    """
+
+    def __init__(self, fetch=fetch_all_data, interval=POLL_INTERVAL, wards=None,
+                 freeze_after=FREEZE_CONFIRMATIONS, reverify_interval=REVERIFY_INTERVAL,
+                 reverify_per_cycle=REVERIFY_PER_CYCLE, scheduler=None, store=None, lease_ttl=LEASE_TTL,
+                 cycle_deadline=CYCLE_DEADLINE, publish_interval=PUBLISH_INTERVAL):
+        self.fetch = fetch
+        self.store = store
+        self.interval = interval
+        self.wards = sorted(wards) if wards is not None else sorted(all_ward_keys())
+        self.freeze_after = freeze_after
+        self.reverify_interval = reverify_interval
+        self.reverify_per_cycle = reverify_per_cycle
+        self.scheduler = scheduler or PriorityScheduler(SETTINGS["wards_per_cycle"])
+        self.lease_ttl = lease_ttl
+        self.cycle_deadline = cycle_deadline
+        self.publish_interval = publish_interval
+        self.owner = REPLICA_ID
+        self._store_cursor = 0    # id of the newest store row already merged
+        self._results = {}        # ward key -> latest result dict
+        self._confirmations = {}  # ward key -> identical "Declared" polls in a row
+        self._frozen = {}         # ward key -> time of the last poll that confirmed it
+        self._updated_at = {}     # ward key -> time of the last successful poll
+        self._stale = {}          # ward key -> time polls of a previously good ward started failing
+        self._stale_views = {}    # ward key -> (result, updated_at, published stale copy)
+        self._snapshot = None
+        self._versions = {}       # version -> [Snapshot, monotonic time it was last read, or None if never]
+        self._thread = None
+        self._lock = threading.Lock()
+        self._published = threading.Condition(self._lock)
+        self._stop = threading.Event()
+
+    def start(self):
+        """Starts the background thread. Calling it again is a no-op."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="tsec-poller", daemon=True)
+        if self.store is not None:
+            # The daemon thread never gets to release its leases when the process exits
+            atexit.register(self._release_ulbs)
+        self._warm_start()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def latest(self):
+        """Returns the most recent Snapshot, or None before the first cycle completes."""
+        return self._snapshot
+
+    def snapshot(self, version=None):
+        """
+        Returns Snapshot `version` while it is retained, otherwise the latest,
+        and keeps it retained for another RETAIN_SECONDS. Sessions and stream
+        clients hold on to a version number and read through here, so memory
+        depends on how many versions are in use, not on how many viewers there
+        are: a version nobody read is dropped as soon as a newer one comes out.
+        """
+        with self._lock:
+            entry = self._versions.get(version)
+            if entry is None:
+                if self._snapshot is None:
+                    return None
+                entry = self._versions[self._snapshot.version]
+            entry[1] = time.monotonic()
+            return entry[0]
+
+    def retain(self, snapshot):
+        """Marks `snapshot` as read now, for readers that got it from `wait_for_version()`."""
+        with self._lock:
+            self._versions[snapshot.version] = [snapshot, time.monotonic()]
+
+    def retained_versions(self):
+        with self._lock:
+            return sorted(self._versions)
+
+    def wait_for_snapshot(self, timeout=None):
+        """Blocks until a first Snapshot has been published or `timeout` expires."""
+        with self._published:
+            self._published.wait_for(lambda: self._snapshot is not None, timeout=timeout)
+            return self._snapshot
+
+    def wait_for_version(self, after, timeout=None):
+        """
+        Blocks until a Snapshot newer than version `after` is published or
+        `timeout` expires, then returns the latest Snapshot (possibly not newer).
+        """
+        with self._published:
+            self._published.wait_for(lambda: self._snapshot is not None and self._snapshot.version > after, timeout=timeout)
+            return self._snapshot
+
+    def frozen_wards(self):
+        return sorted(self._frozen)
+
+    def note_interest(self, ward):
+        """Called when a viewer opens the detail page of `ward` (a ward key) so it is polled more often."""
+        self.scheduler.note_interest(ward)
+
+    def run_once(self):
+        """Runs one scrape cycle in the calling thread and publishes it."""
+        started = time.monotonic()
+        ulbs = None
+        if self.store is not None:
+            ulbs = self._claim_ulbs()
+            self._follow_store(ulbs)
+        due = self._wards_due(ulbs)
+        if due:
+            cache_before = parse_cache_stats()
+            merged = set()
+            last_publish = started
+
+            def on_result(result):
+                nonlocal last_publish
+                self._merge_polled(result)
+                merged.add(ward_key(result))
+                now = time.monotonic()
+                if now - last_publish >= self.publish_interval and len(merged) < len(due):
+                    self._publish(self._current_wards(), now - started, pending=len(due) - len(merged))
+                    last_publish = now
+
+            results = self.fetch(due, on_result=on_result, deadline=self.cycle_deadline)
+            for result in results:
+                if ward_key(result) not in merged:
+                    self._merge_polled(result)
+            if self.store is not None:
+                self.store.record([r for r in results if not failed_poll(r, self._results.get(ward_key(r)))])
+            cache_after = parse_cache_stats()
+            logger.info(
+                "Polled %d wards in %.1fs (%d abandoned at the deadline); parse cache %d hits, %d misses, ~%.0f ms CPU saved",
+                len(due), time.monotonic() - started, len(due) - len(results),
+                cache_after["hits"] - cache_before["hits"],
+                cache_after["misses"] - cache_before["misses"],
+                (cache_after["saved_seconds"] - cache_before["saved_seconds"]) * 1000,
+            )
+        metrics.CYCLE_SECONDS.observe(time.monotonic() - started)
+        metrics.CYCLE_WARDS.set(len(due))
+        self._publish(self._current_wards(), time.monotonic() - started)
+        return self._snapshot
+
+    def _warm_start(self):
+        """Publishes the last stored results, if any, before the first crawl."""
+        if self.store is None or self._snapshot is not None:
+            return
+        try:
+            cursor = self.store.latest_id()
+            stored = self.store.load_latest()
+        except Exception:
+            logger.exception("Could not read the result store; starting cold")
+            return
+        wanted = set(self.wards)
+        now = time.time()
+        self._store_cursor = max(self._store_cursor, cursor)
+        for key, (result, observed_at) in stored.items():
+            if key in wanted:
+                self._merge(result)
+                # Served as stale until the first crawl confirms it
+                self._updated_at[key] = observed_at
+                self._stale[key] = now
+        if self._results:
+            self._publish(self._current_wards(), 0.0, fetched_at=self.store.last_observed_at())
+
+    def _current_wards(self):
+        """Every ward's result in key order, with stale ones marked."""
+        wards = []
+        for key in self.wards:
+            result = self._results.get(key)
+            if result is None:
+                continue
+            if key in self._stale:
+                # Reuse the stale copy published last time unless something in it changed
+                updated_at = self._updated_at.get(key)
+                view = self._stale_views.get(key)
+                if view is None or view[0] is not result or view[1] != updated_at:
+                    view = (result, updated_at, dict(result, stale=True, updated_at=updated_at))
+                    self._stale_views[key] = view
+                result = view[2]
+            else:
+                self._stale_views.pop(key, None)
+            wards.append(result)
+        return wards
+
+    def _claim_ulbs(self):
+        """Takes or renews the lease of every ULB it can and returns the set of ULBs held."""
+        held = set()
+        for ulb in sorted({w[:2] for w in self.wards}):
+            try:
+                if self.store.acquire_lease("ulb:%s:%s" % ulb, self.owner, self.lease_ttl):
+                    held.add(ulb)
+            except Exception:
+                logger.exception("Could not take the lease of ULB %s:%s", *ulb)
+        metrics.LEASED_ULBS.set(len(held))
+        return held
+
+    def release_leases(self):
+        """
+        Gives up this replica's ULB leases so another one takes over at once.
+        The polling thread does this when stopped; callers of `run_once()`
+        must do it themselves when they are done.
+        """
+        if self.store is not None:
+            self._release_ulbs()
+
+    def _release_ulbs(self):
+        for ulb in sorted({w[:2] for w in self.wards}):
+            try:
+                self.store.release_lease("ulb:%s:%s" % ulb, self.owner)
+            except Exception:
+                logger.exception("Could not release the lease of ULB %s:%s", *ulb)
+
+    def _follow_store(self, held):
+        """
+        Merges results other replicas stored since the last cycle. A ULB not in
+        `held` is leased by a live replica that crawls it and only stores
+        changes, so its wards are current even when no new row came in.
+        """
+        wanted = set(self.wards)
+        for row_id, key, result, observed_at in self.store.changes_since(self._store_cursor):
+            self._store_cursor = row_id
+            if key in wanted and result != self._results.get(key):
+                self._merge(result)
+                self._updated_at[key] = observed_at
+        for key in [k for k in self._stale if k[:2] not in held]:
+            del self._stale[key]
+
+    def _wards_due(self, ulbs=None):
+        """
+        The scheduler's pick of open wards, plus the frozen wards that are oldest
+        past their re-verification time; only wards of `ulbs` when given.
+        """
+        wards = self.wards if ulbs is None else [w for w in self.wards if w[:2] in ulbs]
+        due = self.scheduler.next_batch([w for w in wards if w not in self._frozen])
+        if self.reverify_interval:
+            cutoff = time.time() - self.reverify_interval
+            stale = sorted((checked, w) for w, checked in self._frozen.items() if checked <= cutoff and (ulbs is None or w[:2] in ulbs))
+            due.extend(w for _, w in stale[:self.reverify_per_cycle])
+        return due
+
+    def _merge_polled(self, result):
+        metrics.WARD_RESULTS.labels(status=result['status']).inc()
+        ward = ward_key(result)
+        if not failed_poll(result, self._results.get(ward)):
+            self.scheduler.observe(ward, result != self._results.get(ward))
+        self._merge(result)
+
+    def _merge(self, result):
+        ward = ward_key(result)
+        previous = self._results.get(ward)
+
+        if failed_poll(result, previous):
+            if previous is not None and previous['status'] != 'Connection Error':
+                # Stale-while-revalidate: keep serving the last good result
+                self._stale.setdefault(ward, time.time())
+                return
+        else:
+            self._stale.pop(ward, None)
+            self._updated_at[ward] = time.time()
+
+        if ward in self._frozen:
+            if result == previous:
+                self._frozen[ward] = time.time()
+                return
+            # The portal corrected a declared result; poll the ward again
+            del self._frozen[ward]
+            self._confirmations[ward] = 0
+
+        if result['status'] == 'Declared':
+            same = previous is not None and result == previous
+            self._confirmations[ward] = self._confirmations.get(ward, 0) + 1 if same else 1
+            if self._confirmations[ward] >= self.freeze_after:
+                self._frozen[ward] = time.time()
+        else:
+            self._confirmations[ward] = 0
+
+        if result == previous:
+            # Keep the existing dict so unchanged wards are shared between snapshots
+            return
+        self._results[ward] = result
+
+    def _publish(self, wards, duration, fetched_at=None, pending=0):
+        """
+        Publishes `wards` as a new Snapshot, unless every ward is the very same
+        dict as in the current one: then the version stays, so viewers do not
+        rebuild anything. A progress-only update is skipped too; the end of a
+        cycle is still published if a progressive snapshot is out.
+        """
+        with self._published:
+            current = self._snapshot
+            if (current is not None and (pending or not current.pending) and len(wards) == len(current.wards)
+                    and all(a is b for a, b in zip(wards, current.wards))):
+                return
+            version = self._snapshot.version + 1 if self._snapshot else 1
+            by_ulb = {}
+            for item in wards:
+                by_ulb.setdefault((item['district_id'], item['ulb_id']), []).append(item)
+            by_ulb = {key: tuple(items) for key, items in by_ulb.items()}
+            self._snapshot = Snapshot(version, fetched_at or time.time(), duration, tuple(wards), by_ulb, pending)
+            now = time.monotonic()
+            self._versions = {
+                v: entry for v, entry in self._versions.items()
+                if entry[1] is not None and now - entry[1] < RETAIN_SECONDS
+            }
+            self._versions[version] = [self._snapshot, None]
+            metrics.SNAPSHOT_VERSION.set(version)
+            metrics.RETAINED_SNAPSHOTS.set(len(self._versions))
+            self._published.notify_all()
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Scrape cycle failed; keeping the previous snapshot")
+            elapsed = time.monotonic() - started
+            self._stop.wait(max(0.0, self.interval - elapsed))
+        if self.store is not None:
+            # Let another replica take over without waiting for the leases to expire
+            self._release_ulbs()
@@ -0,0 +1,254 @@
+import asyncio
+import threading
+import time
+from urllib.parse import urlsplit
+
+from config import SETTINGS
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` requests per second with bursts of `burst`.
+
+    `reserve()` never blocks. It takes a token (going into debt if none is
+    left) and returns how long the caller must wait before sending, so the
+    same bucket paces both threads (time.sleep) and coroutines (asyncio.sleep).
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def refund(self):
+        """Gives back the token of a reservation whose request was never sent."""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+
+class AimdController:
+    """
+    Additive-increase / multiplicative-decrease limit on in-flight requests.
+
+    Every fast successful response grows the limit by 1/limit (about +1 per
+    round trip of the whole window). A timeout, connection error, non-200
+    response or a response slower than `latency_target` halves it, at most
+    once per `cooldown` seconds so one burst of failures counts as one signal.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=16, latency_target=5.0, decrease=0.5, cooldown=2.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def try_acquire(self):
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    def release(self, ok, latency):
+        with self._cond:
+            self.in_flight -= 1
+            if ok and latency <= self.latency_target:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            else:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._last_decrease = now
+            self._cond.notify_all()
+
+    def cancel(self):
+        """Returns a slot whose request was abandoned, without moving the limit."""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the host's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a host that keeps failing.
+
+    After `failure_threshold` consecutive failures the circuit opens and every
+    request is refused for `reset_timeout` seconds. It then goes half-open and
+    lets `half_open_probes` requests through: one success closes it again, a
+    failure re-opens it for another `reset_timeout`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, half_open_probes=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probes = 0
+            if self.state == self.HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    return False
+                self._probes += 1
+            return True
+
+    def record(self, ok):
+        with self._lock:
+            if ok:
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def cancel(self):
+        """Gives back the half-open probe of a request that was abandoned before it got an answer."""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+
+class HostLimiter:
+    """The AIMD controller, token bucket and circuit breaker that guard one host."""
+
+    def __init__(self, controller, bucket, breaker):
+        self.controller = controller
+        self.bucket = bucket
+        self.breaker = breaker
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent (thread engine).
+        Raises CircuitOpenError straight away while the circuit is open.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("TSEC circuit is open")
+        self.controller.acquire()
+        wait = self.bucket.reserve()
+        if wait:
+            time.sleep(wait)
+
+    def release(self, ok, latency):
+        self.controller.release(ok, latency)
+        self.breaker.record(ok)
+
+    def cancel(self, slot=True):
+        """
+        Undoes acquire() for a request that was cancelled (a cycle deadline),
+        so it counts as neither a success nor a failure.
+        """
+        if slot:
+            self.controller.cancel()
+        self.breaker.cancel()
+
+
+class AsyncHostLimiter:
+    """
+    asyncio view of a HostLimiter. Waiting for a slot suspends the coroutine
+    instead of blocking the event loop; the learned limit is shared with the
+    underlying controller, so it carries over between cycles.
+    """
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        """
+        Same contract as HostLimiter.acquire. If the task is cancelled while
+        waiting, the slot, token and half-open probe it took are given back.
+        """
+        if not self.limiter.breaker.allow():
+            raise CircuitOpenError("TSEC circuit is open")
+        slot = False
+        try:
+            async with self._cond:
+                await self._cond.wait_for(self.limiter.controller.try_acquire)
+            slot = True
+            wait = self.limiter.bucket.reserve()
+            if wait:
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            if slot:
+                self.limiter.bucket.refund()
+            await self.cancel(slot)
+            raise
+
+    async def release(self, ok, latency):
+        self.limiter.release(ok, latency)
+        await self._wake()
+
+    async def cancel(self, slot=True):
+        """Undoes acquire() for a request cancelled before it got an answer."""
+        self.limiter.cancel(slot)
+        if slot:
+            await self._wake()
+
+    async def _wake(self):
+        async with self._cond:
+            self._cond.notify_all()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def limiter_for(url):
+    """Returns the process-wide HostLimiter for the host of `url`."""
+    host = urlsplit(url).netloc
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = HostLimiter(
+                AimdController(
+                    initial=SETTINGS["initial_in_flight"],
+                    minimum=SETTINGS["min_in_flight"],
+                    maximum=SETTINGS["max_in_flight"],
+                    latency_target=SETTINGS["latency_target"],
+                ),
+                TokenBucket(SETTINGS["requests_per_second"], SETTINGS["request_burst"]),
+                CircuitBreaker(SETTINGS["breaker_failures"], SETTINGS["breaker_reset_timeout"]),
+            )
+        return _limiters[host]
+
+def reset_limiters():
+    """Drops every host's learned limits and breaker state."""
+    with _limiters_lock:
+        _limiters.clear()
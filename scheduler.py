@@ -0,0 +1,68 @@
+import threading
+import time
+
+# --- PRIORITY SCHEDULER CONFIGURATION ---
+MAX_BACKOFF_CYCLES = 8  # A quiet ward is polled at least every 8 cycles even when wards_per_cycle is short
+INTEREST_WINDOW = 120   # Seconds a viewed ward keeps being polled every cycle after its detail page was last shown
+
+
+class PriorityScheduler:
+    """
+    Spends a per-cycle poll budget on the wards where results are moving.
+
+    A ward whose result changed on its last poll is due again the next
+    cycle. Every poll that returns the same result doubles the number of
+    cycles until it is due, up to `max_backoff` cycles, and the next change
+    resets it. Wards whose detail page was viewed in the last
+    `interest_window` seconds are due every cycle regardless. Wards never
+    polled, and wards whose last poll failed or was abandoned, are due
+    straight away.
+
+    With a `budget` of N wards per cycle, viewed wards are served first,
+    then due wards by how recently they changed, then longest overdue
+    first; budget left over goes to the wards backing off that are due
+    soonest. Backoff therefore only defers a ward when the budget is
+    short. A budget of 0 polls every open ward every cycle.
+    """
+
+    def __init__(self, budget=0, max_backoff=MAX_BACKOFF_CYCLES, interest_window=INTEREST_WINDOW):
+        self.budget = budget
+        self.max_backoff = max_backoff
+        self.interest_window = interest_window
+        self._cycle = 0
+        self._backoff = {}   # ward key -> cycles to wait after its last poll (1 = poll every cycle)
+        self._due = {}       # ward key -> first cycle it is due again
+        self._interest = {}  # ward key -> time its detail page was last viewed
+        self._lock = threading.Lock()
+
+    def next_batch(self, open_wards):
+        """`open_wards` is a sorted list of ward keys; returns the ones to poll now, most urgent first."""
+        self._cycle += 1
+        cutoff = time.time() - self.interest_window
+        with self._lock:
+            self._interest = {w: seen for w, seen in self._interest.items() if seen > cutoff}
+            watched = set(self._interest)
+
+        due = sorted(open_wards, key=lambda w: (
+            w not in watched, self._due.get(w, 0) > self._cycle, self._backoff.get(w, 1), self._due.get(w, 0),
+        ))
+        if self.budget:
+            due = due[:self.budget]
+        for ward in due:
+            # Retried next cycle unless observe() reports a result before then
+            self._due[ward] = self._cycle + 1
+        return due
+
+    def observe(self, ward, changed):
+        """Records a successful poll of `ward` and whether its result changed."""
+        backoff = 1 if changed else min(self._backoff.get(ward, 1) * 2, self.max_backoff)
+        self._backoff[ward] = backoff
+        self._due[ward] = self._cycle + backoff
+
+    def note_interest(self, ward):
+        """Marks `ward` as being viewed; safe to call from any thread."""
+        with self._lock:
+            self._interest[ward] = time.time()
+
+    def backoff(self, ward):
+        return self._backoff.get(ward, 1)
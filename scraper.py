@@ -0,0 +1,548 @@
+import requests
+import urllib3
+import concurrent.futures
+import os
+import sys
+import threading
+import time
+
+import archive
+import metrics
+import parsers
+import ratelimit
+from config import SETTINGS, TARGETS, TARGETS_BY_KEY
+from parsers import TOKEN_FIELD
+from ratelimit import CircuitOpenError, limiter_for
+
+# Disable SSL warnings
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# --- CONFIGURATION ---
+# The ULBs to crawl come from the targets file (see config.py)
+BASE_URL = os.environ.get("TSEC_BASE_URL", "https://tsec.gov.in/knowPRUrban.se")
+
+POOL_SIZE = SETTINGS["max_in_flight"]  # Keep-alive connections, one per possible in-flight request
+
+# Responses that mean the server refused our cached Struts token
+TOKEN_REJECTED_STATUSES = (401, 403, 419, 440)
+TOKEN_REJECTED_MARKERS = (b'invalid token', b'token expired', b'session expired', b'session has expired', b'duplicate submission')
+
+# --- FETCH ENGINE ---
+# "threads" uses a ThreadPoolExecutor with blocking requests, "asyncio" uses
+# aiohttp (see scraper_async.py). Either way, requests in flight are capped by
+# the adaptive per-host limiter in ratelimit.py, not by the number of workers.
+FETCH_ENGINE = os.environ.get("TSEC_FETCH_ENGINE", "threads")
+
+# --- BULK FETCH ---
+# TSEC documents no consolidated report, so these are the form variants tried,
+# in order, to get every ward of a ULB from one POST (overrides of build_payload).
+# A variant is used only if its GridView1 table splits into per-ward blocks
+# (see parsers.split_ward_rows); otherwise wards are fetched one by one.
+BULK_FETCH = os.environ.get("TSEC_BULK_FETCH", "auto")  # "auto" probes the variants per ULB, "off" never does
+BULK_VARIANTS = (
+    {'property(ward_id)': ''},
+    {'property(ward_id)': 'all'},
+    {'property(ward_id)': '0'},
+    {'property(ward_id)': '', 'property(typeOfReport)': 'C'},
+)
+BULK_MIN_WARDS = 3          # Wards of one ULB due in a cycle before a consolidated fetch is worth it
+BULK_RETRY_INTERVAL = 1800  # Seconds before a ULB where no variant worked is probed again
+
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Referer': 'https://tsec.gov.in/'
+}
+
+# --- ROBUST NETWORK FUNCTION ---
+
+def get_session(pool_size=POOL_SIZE):
+    """Creates a robust keep-alive session with browser headers and a connection pool"""
+    session = requests.Session()
+    session.headers.update(BROWSER_HEADERS)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def token_rejected(status_code, content):
+    """True when the POST failed because the server no longer accepts our token"""
+    if status_code in TOKEN_REJECTED_STATUSES:
+        return True
+    body = content.lower()
+    return any(marker in body for marker in TOKEN_REJECTED_MARKERS)
+
+class TokenRejectedError(Exception):
+    """The server rejected a freshly fetched token as well; the POST counts as failed."""
+
+
+def build_payload(target, ward_num, token):
+    return {
+        TOKEN_FIELD: token,
+        'mode': 'getULBWMDetails',
+        'property(knowYour)': 'WM',
+        'property(year)': target.year,
+        'property(electionFor)': target.election_id,
+        'property(district_id)': target.district_id,
+        'property(ulb_id)': target.ulb_id,
+        'property(ward_id)': str(ward_num),
+        'property(typeOfReport)': 'A'
+    }
+
+def build_bulk_payload(target, variant, token):
+    payload = build_payload(target, '', token)
+    payload.update(variant)
+    return payload
+
+
+PARSE_CACHE = parsers.ParseCache()
+
+def parse_ward_response(ward_num, content, target=None):
+    """
+    Parses a results page into the per-ward dict.
+    Returns (result, token) where token is the Struts token found on the page, if any.
+
+    With a `target`, the result is tagged with its ULB and a page identical to
+    the ward's previous one (ignoring the token) returns the cached result
+    without being parsed again.
+    """
+    token = parsers.extract_token(content)
+    if target is not None:
+        key = (target.district_id, target.ulb_id, ward_num)
+        digest = parsers.page_digest(content, token)
+        cached = PARSE_CACHE.get(key, digest)
+        metrics.PARSE_CACHE.labels(result="hit" if cached is not None else "miss").inc()
+        if cached is not None:
+            return cached, token
+
+    if target is not None:
+        # Archived before parsing, so a page the parser chokes on is kept too
+        archive.record_page(key, content, digest)
+
+    started = time.process_time()
+    result = ward_result_from_page(ward_num, content)
+
+    parse_seconds = time.process_time() - started
+    metrics.PARSE_SECONDS.observe(parse_seconds)
+    if target is not None:
+        tag_result(target, result)
+        PARSE_CACHE.put(key, digest, result, parse_seconds)
+    return result, token
+
+def ward_result_from_page(ward_num, content):
+    """The (untagged) per-ward dict of a single-ward results page."""
+    rows, _ = parsers.parse_page(content)
+    if rows is None:
+        return {"ward": ward_num, "status": "Pending", "summary": {}, "candidates": []}
+    return build_ward_result(ward_num, *parsers.rows_to_results(rows))
+
+def bulk_results_from_page(content):
+    """{ward: untagged per-ward dict} of a consolidated results page, or None if it is not one."""
+    rows, _ = parsers.parse_page(content)
+    blocks = parsers.split_ward_rows(rows) if rows is not None else None
+    if blocks is None:
+        return None
+    return {ward: build_ward_result(ward, *parsers.rows_to_results(ward_rows)) for ward, ward_rows in blocks.items()}
+
+def parse_bulk_response(target, content):
+    """
+    Splits a consolidated results page of `target` into per-ward results.
+    Returns ({ward: result}, token); the dict is None when the page is not a
+    consolidated table of that ULB's wards. Wards without results yet may be
+    missing from it.
+    """
+    token = parsers.extract_token(content)
+    key = (target.district_id, target.ulb_id, None)
+    digest = parsers.page_digest(content, token)
+    cached = PARSE_CACHE.get(key, digest)
+    metrics.PARSE_CACHE.labels(result="hit" if cached is not None else "miss").inc()
+    if cached is not None:
+        return cached, token
+    archive.record_page(key, content, digest)
+
+    started = time.process_time()
+    by_ward = bulk_results_from_page(content)
+    if by_ward is None or not all(1 <= ward <= target.wards for ward in by_ward):
+        return None, token
+    for result in by_ward.values():
+        tag_result(target, result)
+
+    parse_seconds = time.process_time() - started
+    metrics.PARSE_SECONDS.observe(parse_seconds)
+    PARSE_CACHE.put(key, digest, by_ward, parse_seconds)
+    return by_ward, token
+
+def build_ward_result(ward_num, summary_data, candidate_rows):
+    winner_data = None
+    status = "Pending"
+    for cand in candidate_rows:
+        if "elected" in cand['Status'].lower() or "won" in cand['Status'].lower():
+            status = "Declared"
+            winner_data = cand
+            break
+
+    return {
+        "ward": ward_num,
+        "status": status,
+        "winner": winner_data,
+        "summary": summary_data,
+        "candidates": candidate_rows
+    }
+
+
+class TsecClient:
+    """
+    Pooled HTTP client shared by every ward fetch.
+
+    The Struts token is fetched once and reused for every POST. A token seen
+    in any later response replaces the cached one, and a rejected token is
+    refreshed exactly once, no matter how many workers noticed it.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE):
+        self.session = get_session(pool_size)
+        self._token = None
+        self._lock = threading.Lock()
+
+    def token(self):
+        with self._lock:
+            if self._token is None:
+                self._token = self._fetch_token()
+            return self._token
+
+    def refresh_token(self, stale):
+        """Replaces `stale` with a fresh token unless another worker already did."""
+        with self._lock:
+            if self._token is None or self._token == stale:
+                self._token = self._fetch_token()
+            return self._token
+
+    def remember_token(self, token):
+        if token:
+            with self._lock:
+                self._token = token
+
+    def post_ward(self, target, ward_num):
+        return self.post(lambda token: build_payload(target, ward_num, token))
+
+    def post(self, payload_for):
+        """
+        POSTs the form `payload_for(token)` builds, retrying once with a fresh
+        token if it is rejected. Raises TokenRejectedError if the fresh token
+        is rejected too, so a rejection page is never parsed as a result.
+        """
+        token = self.token()
+        resp = self._send('POST', data=payload_for(token), timeout=20)
+        if token_rejected(resp.status_code, resp.content):
+            token = self.refresh_token(token)
+            resp = self._send('POST', data=payload_for(token), timeout=20)
+            if token_rejected(resp.status_code, resp.content):
+                raise TokenRejectedError("Token rejected after a refresh")
+        return resp
+
+    def _send(self, method, **kwargs):
+        """Sends one request once the host limiter allows it and reports the outcome back."""
+        limiter = limiter_for(BASE_URL)
+        limiter.acquire()
+        started = time.monotonic()
+        outcome = "error"
+        try:
+            resp = self.session.request(method, BASE_URL, verify=False, **kwargs)
+            outcome = str(resp.status_code)
+            return resp
+        finally:
+            latency = time.monotonic() - started
+            limiter.release(outcome == "200", latency)
+            observe_request(method, outcome, latency)
+
+    def _fetch_token(self):
+        resp = self._send('GET', timeout=15)
+        token = parsers.extract_token(resp.content)
+        if not token:
+            raise ValueError("Token not found")
+        return token
+
+
+class BulkVariants:
+    """
+    Remembers, per ULB, which of BULK_VARIANTS returns a consolidated page.
+
+    Until one is known, each cycle probes the next untried variant with one
+    extra request while the wards are fetched one by one, so probing never
+    delays results. Once every variant has failed, the ULB is left alone for
+    BULK_RETRY_INTERVAL seconds. A known variant that stops working is
+    forgotten and probing starts over.
+    """
+
+    def __init__(self, retry_interval=BULK_RETRY_INTERVAL):
+        self.retry_interval = retry_interval
+        self._working = {}      # ulb key -> index into BULK_VARIANTS
+        self._next = {}         # ulb key -> index of the next variant to probe
+        self._retry_after = {}  # ulb key -> monotonic time before which nothing is probed
+        self._lock = threading.Lock()
+
+    def variant_for(self, ulb):
+        """(index, known) of the variant to use or probe for `ulb`, or None to fetch ward by ward only."""
+        if BULK_FETCH == "off":
+            return None
+        with self._lock:
+            if ulb in self._working:
+                return self._working[ulb], True
+            if time.monotonic() < self._retry_after.get(ulb, 0):
+                return None
+            return self._next.get(ulb, 0), False
+
+    def worked(self, ulb, index):
+        with self._lock:
+            self._working[ulb] = index
+            self._next.pop(ulb, None)
+            self._retry_after.pop(ulb, None)
+
+    def failed(self, ulb, index):
+        with self._lock:
+            if self._working.get(ulb) == index:
+                del self._working[ulb]
+                return
+            if index != self._next.get(ulb, 0):
+                return
+            if index + 1 < len(BULK_VARIANTS):
+                self._next[ulb] = index + 1
+            else:
+                self._next.pop(ulb, None)
+                self._retry_after[ulb] = time.monotonic() + self.retry_interval
+
+
+BULK_STATE = BulkVariants()
+
+def bulk_plan(target, ward_nums):
+    """
+    How to fetch `ward_nums` of `target`: "bulk" with one consolidated
+    request, "probe" ward by ward plus one request trying the next variant,
+    or None for ward by ward only.
+    """
+    if len(ward_nums) < BULK_MIN_WARDS:
+        return None
+    chosen = BULK_STATE.variant_for(target.key)
+    if chosen is None:
+        return None
+    return "bulk" if chosen[1] else "probe"
+
+
+_client = None
+_client_lock = threading.Lock()
+_executor = None
+
+def observe_request(method, outcome, latency):
+    """Records one TSEC request: GETs fetch a token, POSTs fetch a ward."""
+    kind = "token" if method == 'GET' else "post"
+    metrics.REQUEST_SECONDS.labels(kind=kind).observe(latency)
+    metrics.REQUESTS.labels(kind=kind, outcome=outcome).inc()
+
+def _limiter_gauge(read):
+    return lambda: read(limiter_for(BASE_URL))
+
+metrics.IN_FLIGHT.set_function(_limiter_gauge(lambda limiter: limiter.controller.in_flight))
+metrics.CONCURRENCY_LIMIT.set_function(_limiter_gauge(lambda limiter: int(limiter.controller.limit)))
+metrics.CIRCUIT_OPEN.set_function(_limiter_gauge(lambda limiter: limiter.breaker.state != limiter.breaker.CLOSED))
+
+def get_client():
+    """Returns the process-wide TsecClient"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = TsecClient()
+        return _client
+
+def get_executor():
+    """
+    Returns the process-wide worker pool of the threads engine, kept across
+    cycles so abandoned fetches never pile up in executors of their own.
+    Enough workers to reach the limiter's ceiling; the limiter decides how
+    many actually send.
+    """
+    global _executor
+    with _client_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=SETTINGS["max_in_flight"], thread_name_prefix="tsec-fetch")
+        return _executor
+
+def reset_state():
+    """
+    Forgets the shared client and its token, the parse cache, the host
+    limiters and which bulk variants work, so the next crawl starts cold.
+    Used by the benchmarks.
+    """
+    global _client, PARSE_CACHE, BULK_STATE
+    with _client_lock:
+        _client = None
+    PARSE_CACHE = parsers.ParseCache()
+    BULK_STATE = BulkVariants()
+    ratelimit.reset_limiters()
+    async_engine = sys.modules.get("scraper_async")
+    if async_engine is not None:
+        async_engine._last_token = None
+
+def ward_key(result):
+    """(district_id, ulb_id, ward) of a per-ward result"""
+    return (result['district_id'], result['ulb_id'], result['ward'])
+
+def all_ward_keys():
+    return [key for target in TARGETS for key in target.ward_keys()]
+
+def parse_cache_stats():
+    return PARSE_CACHE.stats()
+
+def tag_result(target, result):
+    """Marks a per-ward result with the ULB it belongs to"""
+    result['district_id'] = target.district_id
+    result['ulb_id'] = target.ulb_id
+    return result
+
+def fetch_ward_data_with_retry(ward_num, retries=3, client=None, target=None, deadline_at=None):
+    """
+    Tries to fetch data. If it fails, waits and retries automatically.
+    `target` defaults to the first configured ULB. No retry is started that
+    could not begin before `deadline_at` (a time.monotonic() value).
+    """
+    client = client or get_client()
+    target = target or TARGETS[0]
+
+    for attempt in range(retries):
+        if deadline_at is not None and time.monotonic() >= deadline_at:
+            # The cycle has given up on this ward; free the worker for the next one
+            return tag_result(target, {"ward": ward_num, "status": "Connection Error", "candidates": []})
+        try:
+            # 1. Post Data (the client supplies and, if needed, refreshes the token)
+            post_resp = client.post_ward(target, ward_num)
+
+            # 2. Check Validity
+            if post_resp.status_code != 200:
+                raise ValueError(f"Status Code: {post_resp.status_code}")
+
+            # 3. Parse Data
+            result, token = parse_ward_response(ward_num, post_resp.content, target)
+            client.remember_token(token)
+            return result
+
+        except CircuitOpenError:
+            # The portal is failing; don't queue more requests behind backoff sleeps
+            return tag_result(target, {"ward": ward_num, "status": "Connection Error", "candidates": []})
+
+        except Exception as e:
+            backoff = 2 ** attempt
+            if attempt == retries - 1 or (deadline_at is not None and time.monotonic() + backoff >= deadline_at):
+                return tag_result(target, {"ward": ward_num, "status": "Connection Error", "candidates": []})
+            else:
+                metrics.RETRIES.inc()
+                time.sleep(backoff)
+
+def fetch_ulb_bulk(target, ward_nums, client=None, deadline_at=None):
+    """
+    Fetches `ward_nums` of `target` with one consolidated request, using or
+    probing the ULB's bulk variant. Returns (results, missing): the results
+    the page covered and the ward numbers still to be fetched one by one
+    (all of them if the request or the variant failed). A failed request is
+    not retried; the per-ward fetches that replace it are.
+    """
+    client = client or get_client()
+    chosen = BULK_STATE.variant_for(target.key)
+    if chosen is None or (deadline_at is not None and time.monotonic() >= deadline_at):
+        return [], list(ward_nums)
+    index = chosen[0]
+    try:
+        resp = client.post(lambda token: build_bulk_payload(target, BULK_VARIANTS[index], token))
+        if resp.status_code != 200:
+            raise ValueError(f"Status Code: {resp.status_code}")
+    except Exception:
+        metrics.BULK_FETCHES.labels(outcome="error").inc()
+        return [], list(ward_nums)
+
+    by_ward, token = parse_bulk_response(target, resp.content)
+    client.remember_token(token)
+    if by_ward is None:
+        BULK_STATE.failed(target.key, index)
+        metrics.BULK_FETCHES.labels(outcome="unsupported").inc()
+        return [], list(ward_nums)
+    BULK_STATE.worked(target.key, index)
+    metrics.BULK_FETCHES.labels(outcome="used").inc()
+    return [by_ward[w] for w in ward_nums if w in by_ward], [w for w in ward_nums if w not in by_ward]
+
+def fetch_all_data(wards=None, progress=None, on_result=None, deadline=None):
+    """
+    Scrapes the given wards once and returns the results sorted by ward key.
+    `wards` is a list of (district_id, ulb_id, ward) keys and defaults to
+    every ward of every configured ULB.
+    `progress` is an optional callback receiving (completed, total).
+    `on_result` is an optional callback receiving each ward's result as soon
+    as it is ready, in the calling thread.
+    After `deadline` seconds, wards still in flight are abandoned and left out
+    of the results, so one slow ward cannot hold back a whole cycle.
+    A ULB with at least BULK_MIN_WARDS wards due and a known bulk variant is
+    fetched with a single consolidated request (fetch_ulb_bulk); the wards
+    it does not cover are then fetched one by one.
+    The engine is chosen by FETCH_ENGINE.
+    """
+    wards = list(wards) if wards is not None else all_ward_keys()
+
+    if FETCH_ENGINE == "asyncio":
+        import scraper_async
+        return scraper_async.fetch_all_data(wards, progress=progress, on_result=on_result, deadline=deadline)
+    if FETCH_ENGINE != "threads":
+        raise ValueError(f"Unknown fetch engine: {FETCH_ENGINE}")
+
+    results = []
+    if not wards:
+        return results
+
+    deadline_at = time.monotonic() + deadline if deadline else None
+    by_ulb = {}
+    for district_id, ulb_id, ward in wards:
+        by_ulb.setdefault((district_id, ulb_id), []).append(ward)
+
+    executor = get_executor()
+    try:
+        bulk_futures = {}  # future -> target
+        pending = set()
+
+        def submit_wards(target, ward_nums):
+            for ward in ward_nums:
+                pending.add(executor.submit(fetch_ward_data_with_retry, ward, target=target, deadline_at=deadline_at))
+
+        for ulb, ward_nums in by_ulb.items():
+            target = TARGETS_BY_KEY[ulb]
+            plan = bulk_plan(target, ward_nums)
+            if plan is not None:
+                # A probe covers no wards; it only finds out whether its variant works
+                future = executor.submit(fetch_ulb_bulk, target, ward_nums if plan == "bulk" else (), deadline_at=deadline_at)
+                bulk_futures[future] = target
+                pending.add(future)
+            if plan != "bulk":
+                submit_wards(target, ward_nums)
+
+        while pending:
+            timeout = max(0.0, deadline_at - time.monotonic()) if deadline_at is not None else None
+            done, pending = concurrent.futures.wait(pending, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                metrics.DEADLINE_SKIPPED.inc(len(wards) - len(results))
+                break
+            for future in done:
+                if future in bulk_futures:
+                    ready, missing = future.result()
+                    submit_wards(bulk_futures[future], missing)
+                else:
+                    ready = [future.result()]
+                for result in ready:
+                    results.append(result)
+                    if on_result:
+                        on_result(result)
+                    if progress:
+                        progress(len(results), len(wards))
+    finally:
+        # Queued fetches are dropped; those in flight stop at their next deadline check
+        for future in pending:
+            future.cancel()
+
+    results.sort(key=ward_key)
+    return results
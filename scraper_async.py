@@ -0,0 +1,215 @@
+import asyncio
+import time
+
+import aiohttp
+
+import metrics
+import parsers
+import scraper
+from ratelimit import AsyncHostLimiter, CircuitOpenError, limiter_for
+
+# Token carried over between cycles so each crawl starts without a GET
+_last_token = None
+
+
+class AsyncTsecClient:
+    """
+    asyncio counterpart of scraper.TsecClient.
+
+    Shares one aiohttp session (and its connection pool) across all wards of a
+    cycle, reuses the Struts token and refreshes it once when it is rejected.
+    Every request waits for the shared per-host limiter.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.limiter = AsyncHostLimiter(limiter_for(scraper.BASE_URL))
+        self._token = _last_token
+        self._lock = asyncio.Lock()
+
+    async def token(self):
+        async with self._lock:
+            if self._token is None:
+                self._token = await self._fetch_token()
+            return self._token
+
+    async def refresh_token(self, stale):
+        async with self._lock:
+            if self._token is None or self._token == stale:
+                self._token = await self._fetch_token()
+            return self._token
+
+    def remember_token(self, token):
+        global _last_token
+        if token:
+            self._token = _last_token = token
+
+    async def post_ward(self, target, ward_num):
+        """Returns (status_code, body) for one ward POST."""
+        return await self.post(lambda token: scraper.build_payload(target, ward_num, token))
+
+    async def post(self, payload_for):
+        """
+        Returns (status_code, body) for the form `payload_for(token)` builds,
+        retried once with a fresh token if rejected. Raises
+        scraper.TokenRejectedError if the fresh token is rejected too.
+        """
+        token = await self.token()
+        status, body = await self._post(payload_for(token))
+        if scraper.token_rejected(status, body):
+            token = await self.refresh_token(token)
+            status, body = await self._post(payload_for(token))
+            if scraper.token_rejected(status, body):
+                raise scraper.TokenRejectedError("Token rejected after a refresh")
+        return status, body
+
+    async def _post(self, data):
+        return await self._send('POST', data=data, timeout=aiohttp.ClientTimeout(total=20))
+
+    async def _send(self, method, **kwargs):
+        """
+        Returns (status_code, body) once the host limiter allows the request.
+        A request cancelled at the cycle deadline hands its slot back without
+        counting as a failure for the AIMD limit or the circuit breaker.
+        """
+        await self.limiter.acquire()
+        started = time.monotonic()
+        outcome = "error"
+        try:
+            async with self.session.request(method, scraper.BASE_URL, **kwargs) as resp:
+                body = await resp.read()
+            outcome = str(resp.status)
+            return resp.status, body
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            latency = time.monotonic() - started
+            if outcome == "cancelled":
+                await self.limiter.cancel()
+            else:
+                await self.limiter.release(outcome == "200", latency)
+            scraper.observe_request(method, outcome, latency)
+
+    async def _fetch_token(self):
+        _, body = await self._send('GET', timeout=aiohttp.ClientTimeout(total=15))
+        token = parsers.extract_token(body)
+        if not token:
+            raise ValueError("Token not found")
+        return token
+
+
+async def fetch_ward_data_with_retry(client, target, ward_num, retries=3, deadline_at=None):
+    """
+    Same contract as scraper.fetch_ward_data_with_retry, but the backoff
+    between attempts is an asyncio.sleep and does not hold a worker.
+    """
+    for attempt in range(retries):
+        try:
+            status, body = await client.post_ward(target, ward_num)
+
+            if status != 200:
+                raise ValueError(f"Status Code: {status}")
+
+            result, token = scraper.parse_ward_response(ward_num, body, target)
+            client.remember_token(token)
+            return result
+
+        except CircuitOpenError:
+            return scraper.tag_result(target, {"ward": ward_num, "status": "Connection Error", "candidates": []})
+
+        except Exception:
+            backoff = 2 ** attempt
+            if attempt == retries - 1 or (deadline_at is not None and time.monotonic() + backoff >= deadline_at):
+                return scraper.tag_result(target, {"ward": ward_num, "status": "Connection Error", "candidates": []})
+            metrics.RETRIES.inc()
+            await asyncio.sleep(backoff)
+
+
+async def fetch_ulb_bulk(client, target, ward_nums, deadline_at=None):
+    """Same contract as scraper.fetch_ulb_bulk."""
+    chosen = scraper.BULK_STATE.variant_for(target.key)
+    if chosen is None or (deadline_at is not None and time.monotonic() >= deadline_at):
+        return [], list(ward_nums)
+    index = chosen[0]
+    try:
+        status, body = await client.post(lambda token: scraper.build_bulk_payload(target, scraper.BULK_VARIANTS[index], token))
+        if status != 200:
+            raise ValueError(f"Status Code: {status}")
+    except Exception:
+        metrics.BULK_FETCHES.labels(outcome="error").inc()
+        return [], list(ward_nums)
+
+    by_ward, token = scraper.parse_bulk_response(target, body)
+    client.remember_token(token)
+    if by_ward is None:
+        scraper.BULK_STATE.failed(target.key, index)
+        metrics.BULK_FETCHES.labels(outcome="unsupported").inc()
+        return [], list(ward_nums)
+    scraper.BULK_STATE.worked(target.key, index)
+    metrics.BULK_FETCHES.labels(outcome="used").inc()
+    return [by_ward[w] for w in ward_nums if w in by_ward], [w for w in ward_nums if w not in by_ward]
+
+
+async def fetch_all_data_async(wards, progress=None, on_result=None, deadline=None):
+    connector = aiohttp.TCPConnector(limit=scraper.POOL_SIZE, ssl=False)
+    results = []
+    deadline_at = time.monotonic() + deadline if deadline else None
+
+    async with aiohttp.ClientSession(headers=scraper.BROWSER_HEADERS, connector=connector) as session:
+        client = AsyncTsecClient(session)
+        by_ulb = {}
+        for district_id, ulb_id, ward in wards:
+            by_ulb.setdefault((district_id, ulb_id), []).append(ward)
+
+        bulk_tasks = {}  # task -> target
+        pending = set()
+
+        def start_wards(target, ward_nums):
+            for ward in ward_nums:
+                pending.add(asyncio.ensure_future(fetch_ward_data_with_retry(client, target, ward, deadline_at=deadline_at)))
+
+        for ulb, ward_nums in by_ulb.items():
+            target = scraper.TARGETS_BY_KEY[ulb]
+            plan = scraper.bulk_plan(target, ward_nums)
+            if plan is not None:
+                task = asyncio.ensure_future(fetch_ulb_bulk(client, target, ward_nums if plan == "bulk" else (), deadline_at=deadline_at))
+                bulk_tasks[task] = target
+                pending.add(task)
+            if plan != "bulk":
+                start_wards(target, ward_nums)
+
+        try:
+            while pending:
+                timeout = max(0.0, deadline_at - time.monotonic()) if deadline_at is not None else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    metrics.DEADLINE_SKIPPED.inc(len(wards) - len(results))
+                    break
+                for task in done:
+                    if task in bulk_tasks:
+                        ready, missing = task.result()
+                        start_wards(bulk_tasks[task], missing)
+                    else:
+                        ready = [task.result()]
+                    for result in ready:
+                        results.append(result)
+                        if on_result:
+                            on_result(result)
+                        if progress:
+                            progress(len(results), len(wards))
+        finally:
+            # Unlike threads, unfinished wards can be cancelled outright
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    results.sort(key=scraper.ward_key)
+    return results
+
+
+def fetch_all_data(wards, progress=None, on_result=None, deadline=None):
+    """Synchronous entry point used by scraper.fetch_all_data when FETCH_ENGINE is "asyncio"."""
+    if not wards:
+        return []
+    return asyncio.run(fetch_all_data_async(wards, progress=progress, on_result=on_result, deadline=deadline))
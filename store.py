@@ -0,0 +1,169 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- LOCAL RESULT STORE ---
+DB_PATH = os.environ.get("TSEC_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tsec_results.sqlite3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ward_results (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    district_id TEXT    NOT NULL,
+    ulb_id      TEXT    NOT NULL,
+    ward        INTEGER NOT NULL,
+    observed_at REAL    NOT NULL,
+    status      TEXT    NOT NULL,
+    result      TEXT    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ward_results_by_ward ON ward_results (district_id, ulb_id, ward, id);
+CREATE TABLE IF NOT EXISTS leases (
+    name        TEXT PRIMARY KEY,
+    owner       TEXT NOT NULL,
+    expires_at  REAL NOT NULL
+);
+"""
+
+
+def _serialize(result):
+    return json.dumps(result, sort_keys=True, separators=(',', ':'))
+
+
+class SnapshotStore:
+    """
+    Append-only SQLite history of per-ward results.
+
+    A row is written only when a ward's result differs from the last one
+    stored for it, so the table doubles as a change log (for example, when
+    each ward was declared) and its newest row per ward is the last known
+    snapshot to serve straight after a restart. Connection errors are not
+    observations of a ward and are never stored.
+
+    Several processes may share one database file. Leases then decide which
+    process crawls what, and the others follow the rows it writes through
+    `changes_since()`.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")  # Wait for writers in other processes
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._last = {}  # ward key -> serialized result of the newest stored row
+
+    def load_latest(self):
+        """Returns {ward key: (result, observed_at)} from the newest row of every ward."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT district_id, ulb_id, ward, observed_at, result FROM ward_results"
+                " WHERE id IN (SELECT MAX(id) FROM ward_results GROUP BY district_id, ulb_id, ward)"
+            ).fetchall()
+            latest = {}
+            for district_id, ulb_id, ward, observed_at, result in rows:
+                key = (district_id, ulb_id, ward)
+                self._last[key] = result
+                latest[key] = (json.loads(result), observed_at)
+            return latest
+
+    def latest_id(self):
+        """Id of the newest row, the starting point for `changes_since()`."""
+        with self._lock:
+            (value,) = self._conn.execute("SELECT MAX(id) FROM ward_results").fetchone()
+            return value or 0
+
+    def changes_since(self, after_id):
+        """[(id, ward key, result, observed_at)] for every row newer than `after_id`, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, district_id, ulb_id, ward, observed_at, result FROM ward_results WHERE id > ? ORDER BY id",
+                (after_id,),
+            ).fetchall()
+            changes = []
+            for row_id, district_id, ulb_id, ward, observed_at, result in rows:
+                key = (district_id, ulb_id, ward)
+                self._last[key] = result
+                changes.append((row_id, key, json.loads(result), observed_at))
+            return changes
+
+    def last_observed_at(self):
+        with self._lock:
+            (value,) = self._conn.execute("SELECT MAX(observed_at) FROM ward_results").fetchone()
+            return value
+
+    def record(self, results, observed_at=None):
+        """Stores the results that changed since the last stored row of their ward. Returns how many."""
+        return self.record_many([(results, observed_at)])
+
+    def record_many(self, observations):
+        """
+        `record()` for a list of (results, observed_at), oldest first, in a
+        single transaction. If it fails, nothing counts as stored, so the same
+        results are written by the next call.
+        """
+        rows = []
+        stored = {}  # ward key -> serialized result, applied to _last once committed
+        with self._lock:
+            for results, observed_at in observations:
+                observed_at = observed_at or time.time()
+                for result in results:
+                    if result['status'] == 'Connection Error':
+                        continue
+                    key = (result['district_id'], result['ulb_id'], result['ward'])
+                    serialized = _serialize(result)
+                    if stored.get(key, self._last.get(key)) == serialized:
+                        continue
+                    stored[key] = serialized
+                    rows.append((*key, observed_at, result['status'], serialized))
+            if rows:
+                with self._conn:
+                    self._conn.execute("BEGIN")
+                    self._conn.executemany(
+                        "INSERT INTO ward_results (district_id, ulb_id, ward, observed_at, status, result)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                self._last.update(stored)
+        return len(rows)
+
+    def history(self, key):
+        """[(observed_at, status)] for every stored change of one ward, oldest first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT observed_at, status FROM ward_results WHERE district_id = ? AND ulb_id = ? AND ward = ? ORDER BY id",
+                key,
+            ).fetchall()
+
+    def declared_at(self, key):
+        """When the ward's current declared result was first seen, or None if it is not declared."""
+        changes = self.history(key)
+        declared_at = None
+        for observed_at, status in changes:
+            if status == 'Declared':
+                declared_at = declared_at or observed_at
+            else:
+                declared_at = None
+        return declared_at
+
+    # --- LEASES ---
+
+    def acquire_lease(self, name, owner, ttl):
+        """
+        Takes or renews the lease `name` for `ttl` seconds. Succeeds when the
+        lease is free, expired or already held by `owner`.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)"
+                " ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at"
+                " WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+                (name, owner, now + ttl, now),
+            )
+            return cursor.rowcount == 1
+
+    def release_lease(self, name, owner):
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
@@ -1,26 +1,18 @@
 import streamlit as st
-import requests
-from bs4 import BeautifulSoup
-import urllib3
-import concurrent.futures
-import pandas as pd
 import time
-import random
+import zlib
 
-# Disable SSL warnings
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-# --- HARDCODED CONFIGURATION FOR TANDUR ---
-DISTRICT_ID = "24"  # Vikarabad
-ULB_ID = "1"        # Tandur
-YEAR = "2026"
-ELECTION_ID = "190"
-TOTAL_WARDS = 36    # Tandur has 36 wards
-BASE_URL = "https://tsec.gov.in/knowPRUrban.se"
+import analytics
+import api
+import archive
+import metrics
+from config import TARGETS, TARGETS_BY_KEY
+from poller import Poller
+from store import SnapshotStore
 
 # --- PAGE CONFIG ---
 st.set_page_config(
-    page_title="Tandur Election Tracker",
+    page_title=f"{TARGETS[0].name} Election Tracker" if len(TARGETS) == 1 else "Municipal Election Tracker",
     page_icon="🗳️",
     layout="wide",
     initial_sidebar_state="collapsed"
@@ -31,163 +23,141 @@ if 'view' not in st.session_state:
     st.session_state.view = 'dashboard'
 if 'selected_ward' not in st.session_state:
     st.session_state.selected_ward = None
+if 'ulb' not in st.session_state:
+    st.session_state.ulb = TARGETS[0].key
+if 'snapshot_version' not in st.session_state:
+    st.session_state.snapshot_version = None
+
+metrics.RERUNS.inc()
+rerun_started = time.perf_counter()
+
+AUTO_REFRESH = 30  # Seconds between in-place refreshes of the results fragments
+FILL_REFRESH = 3   # Refresh period while a crawl is still filling in wards that have no result yet
 
-# --- ROBUST NETWORK FUNCTION ---
+# Candidate table columns of the analytics model and their display names
+CANDIDATE_COLUMNS = {'sl_no': 'Sl No', 'candidate': 'Candidate Name', 'party': 'Party', 'votes': 'Votes', 'status': 'Status'}
 
-def get_session():
-    """Creates a robust session with browser headers"""
-    session = requests.Session()
-    session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
-        'Referer': 'https://tsec.gov.in/'
-    })
-    return session
+# --- SHARED BACKGROUND POLLER ---
+
+@st.cache_resource(show_spinner=False)
+def get_poller():
+    """One poller per server process, shared by every viewer session."""
+    metrics.start_server()
+    if archive.REPLAY_PATH:
+        poller = archive.replay_poller()
+    else:
+        poller = Poller(store=SnapshotStore())
+    poller.start()
+    api.start_server(poller)
+    return poller
 
-def fetch_ward_data_with_retry(ward_num, retries=3):
+def advance_snapshot():
     """
-    Tries to fetch data. If it fails, waits and retries automatically.
+    Moves the session to the latest published snapshot, waiting only for the
+    very first one. Called once per full run of the page.
     """
-    session = get_session()
-    
-    for attempt in range(retries):
-        try:
-            # 1. Get Security Token
-            time.sleep(random.uniform(0.1, 0.5)) 
-            
-            resp = session.get(BASE_URL, verify=False, timeout=15)
-            soup = BeautifulSoup(resp.content, 'html.parser')
-            token_input = soup.find('input', attrs={'name': 'org.apache.struts.taglib.html.TOKEN'})
-            
-            if not token_input:
-                raise ValueError("Token not found")
-                
-            token = token_input['value']
-
-            # 2. Prepare Payload
-            payload = {
-                'org.apache.struts.taglib.html.TOKEN': token,
-                'mode': 'getULBWMDetails',
-                'property(knowYour)': 'WM',
-                'property(year)': YEAR,
-                'property(electionFor)': ELECTION_ID,
-                'property(district_id)': DISTRICT_ID,
-                'property(ulb_id)': ULB_ID,
-                'property(ward_id)': str(ward_num),
-                'property(typeOfReport)': 'A' 
-            }
+    poller = get_poller()
+    snapshot = poller.snapshot()
+    if snapshot is None:
+        with st.spinner("Connecting to TSEC Secure Server..."):
+            poller.wait_for_snapshot(timeout=5)
+        snapshot = poller.snapshot()
+        if snapshot is None:
+            st.info("Fetching the first results from TSEC. This page will update shortly.")
+            time.sleep(2)
+            st.rerun()
+    st.session_state.snapshot_version = snapshot.version
+    return snapshot
 
-            # 3. Post Data
-            post_resp = session.post(BASE_URL, data=payload, verify=False, timeout=20)
-            
-            # 4. Check Validity
-            if post_resp.status_code != 200:
-                raise ValueError(f"Status Code: {post_resp.status_code}")
-
-            post_soup = BeautifulSoup(post_resp.content, 'html.parser')
-            table = post_soup.find('table', id='GridView1')
-            
-            if not table:
-                return {"ward": ward_num, "status": "Pending", "summary": {}, "candidates": []}
-
-            # 5. Parse Data
-            rows = post_soup.find('table', id='GridView1').find_all('tr')
-            
-            summary_data = {}
-            candidate_rows = []
-
-            for row in rows[1:]:
-                if row.find('td', attrs={'colspan': True}):
-                    text = row.get_text(strip=True)
-                    parts = text.split(',')
-                    for part in parts:
-                        if ':' in part:
-                            key, val = part.split(':', 1)
-                            summary_data[key.strip()] = val.strip()
-                    continue
-                
-                cells = row.find_all('td')
-                if len(cells) >= 4:
-                    c_status = cells[4].get_text(strip=True) if len(cells) > 4 else ""
-                    candidate_rows.append({
-                        "Sl No": cells[0].get_text(strip=True),
-                        "Candidate Name": cells[1].get_text(strip=True),
-                        "Party": cells[2].get_text(strip=True),
-                        "Votes": int(cells[3].get_text(strip=True)) if cells[3].get_text(strip=True).isdigit() else 0,
-                        "Status": c_status
-                    })
-
-            winner_data = None
-            status = "Pending"
-            for cand in candidate_rows:
-                if "elected" in cand['Status'].lower() or "won" in cand['Status'].lower():
-                    status = "Declared"
-                    winner_data = cand
-                    break
-
-            return {
-                "ward": ward_num,
-                "status": status,
-                "winner": winner_data,
-                "summary": summary_data,
-                "candidates": candidate_rows
-            }
+def get_snapshot():
+    """
+    The snapshot this session is showing. Fragment reruns keep reading the
+    version the last full run moved to, so every section of the page shows
+    the same results. The session only remembers the version number; the
+    snapshot itself is shared by every session and released by the poller
+    once unused.
+    """
+    return get_poller().snapshot(st.session_state.snapshot_version)
 
-        except Exception as e:
-            if attempt == retries - 1:
-                return {"ward": ward_num, "status": "Connection Error", "candidates": []}
-            else:
-                time.sleep(2 ** attempt) 
-
-@st.cache_data(ttl=60, show_spinner=False)
-def fetch_all_data():
-    results = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-        future_to_ward = {executor.submit(fetch_ward_data_with_retry, i): i for i in range(1, TOTAL_WARDS + 1)}
-        
-        bar = st.progress(0)
-        completed = 0
-        
-        for future in concurrent.futures.as_completed(future_to_ward):
-            results.append(future.result())
-            completed += 1
-            bar.progress(completed / TOTAL_WARDS)
-            
-        bar.empty()
-        
-    results.sort(key=lambda x: x['ward'])
-    return results
+def format_age(timestamp):
+    """'5 min ago' style age of a Unix timestamp"""
+    if not timestamp:
+        return "a while ago"
+    seconds = max(0, time.time() - timestamp)
+    if seconds < 60:
+        return "just now"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min ago"
+    return f"{int(seconds // 3600)} h ago"
 
-# --- UI LOGIC ---
+def open_ward(ward):
+    st.session_state.selected_ward = ward
+    st.session_state.view = 'detail'
 
-# Main Dashboard View
-if st.session_state.view == 'dashboard':
-    
-    # 1. Mobile Friendly Header
-    head_col1, head_col2 = st.columns([3, 1])
-    
-    with head_col1:
-        st.title("🗳️ Tandur Election")
-        st.caption("Vikarabad District | Municipal Results 2026")
-        
-    with head_col2:
-        st.write("") 
-        if st.button("🔄 Refresh", type="primary", use_container_width=True):
-            st.cache_data.clear()
-            st.rerun()
+def close_ward():
+    st.session_state.view = 'dashboard'
 
-    # 2. Data Fetching
-    if 'data' not in st.session_state:
-        with st.spinner("Connecting to TSEC Secure Server..."):
-            data = fetch_all_data()
-            st.session_state.data = data
-    else:
-        data = st.session_state.data
+def card_key(item):
+    """
+    Container key for a ward card. It changes only when something shown on
+    the card changes, so the browser remounts the changed cards and keeps the
+    others in place. Every card is still rebuilt on the server when the grid
+    runs; watch_snapshot() keeps that to once per new snapshot.
+    """
+    winner = item.get('winner') or {}
+    shown = (item['status'], winner.get('Candidate Name'), winner.get('Party'),
+             format_age(item.get('updated_at')) if item.get('stale') else None)
+    return f"card_{item['ward']}_{zlib.crc32(repr(shown).encode()):08x}"
+
+def refresh_interval():
+    """FILL_REFRESH while the running crawl may still add wards of the shown ULB, else AUTO_REFRESH"""
+    snapshot = get_poller().latest()
+    target = TARGETS_BY_KEY[st.session_state.ulb]
+    if snapshot is None or (snapshot.pending and len(snapshot.by_ulb.get(target.key, ())) < target.wards):
+        return FILL_REFRESH
+    return AUTO_REFRESH
+
+# --- UI FRAGMENTS ---
+# A click inside a fragment reruns only that fragment, not the rest of the
+# page. New snapshots are picked up by watch_snapshot(), which checks every
+# REFRESH_EVERY seconds and reruns the page only when the version has moved.
+# The poller publishes wards as they arrive, so on a cold start the page
+# refreshes quickly until every ward has a result.
+REFRESH_EVERY = refresh_interval()
 
-    # 3. Summary Metrics with System Status
+@st.fragment(run_every=REFRESH_EVERY)
+def watch_snapshot():
+    """
+    Draws nothing. Reruns the whole page when a newer snapshot is out or the
+    refresh speed must change, so an idle page costs one attribute read per
+    tick instead of rebuilding every section.
+    """
+    poller = get_poller()
+    if st.session_state.view == 'detail':
+        # Keeps the open ward polled every cycle
+        poller.note_interest((*st.session_state.ulb, st.session_state.selected_ward))
+    latest = poller.latest()
+    if (latest is not None and latest.version != st.session_state.snapshot_version) or refresh_interval() != REFRESH_EVERY:
+        st.rerun()
+
+@st.fragment
+@metrics.timed(metrics.SECTION_SECONDS, section="results_panel")
+def results_panel(ulb):
+    snapshot = get_snapshot()
+    data = snapshot.by_ulb.get(ulb, ())
+    updated = f"Last updated {time.strftime('%H:%M:%S', time.localtime(snapshot.fetched_at))}"
+    if snapshot.pending:
+        updated += f" | updating, {snapshot.pending} wards to go"
+    st.caption(updated)
+    if not data:
+        st.info("No wards of this municipality have been polled yet. Results will appear as the crawl reaches them.")
+        return
+
+    # Summary Metrics with System Status
     declared = sum(1 for d in data if d['status'] == 'Declared')
     pending = sum(1 for d in data if d['status'] == 'Pending')
-    errors = sum(1 for d in data if d['status'] == 'Connection Error')
+    # Wards whose last poll failed, including those still showing their last good result
+    errors = sum(1 for d in data if d['status'] == 'Connection Error' or d.get('stale'))
     
     with st.container(border=True):
         col1, col2, col3 = st.columns(3)
@@ -199,17 +169,24 @@ if st.session_state.view == 'dashboard':
         else:
             col3.metric("System Status", "Healthy")
 
-    st.markdown("### Wards Overview")
+@st.fragment
+@metrics.timed(metrics.SECTION_SECONDS, section="ward_grid")
+def ward_grid(ulb):
+    if st.session_state.view != 'dashboard':
+        # A Details click landed in this fragment; switch the whole page to the detail view
+        st.rerun()
 
-    # 4. Grid Display - CHANGED TO 3 COLUMNS
-    cols_per_row = 3  # <--- Changed from 4 to 3 for larger mobile cards
+    data = get_snapshot().by_ulb.get(ulb, ())
+
+    # Grid Display - 3 Columns for bigger cards
+    cols_per_row = 3
     rows = [data[i:i + cols_per_row] for i in range(0, len(data), cols_per_row)]
 
     for row_items in rows:
         cols = st.columns(cols_per_row)
         for idx, item in enumerate(row_items):
             with cols[idx]:
-                with st.container(border=True):
+                with st.container(border=True, key=card_key(item)):
                     c_head1, c_head2 = st.columns([3,1])
                     c_head1.subheader(f"Ward {item['ward']}")
                     
@@ -223,24 +200,29 @@ if st.session_state.view == 'dashboard':
                     else:
                         st.warning("⏳ Pending")
                         st.markdown("<div style='height: 20px;'></div>", unsafe_allow_html=True)
+
+                    if item.get('stale'):
+                        st.caption(f"Last updated {format_age(item.get('updated_at'))}")
                     
-                    if st.button("Details", key=f"btn_{item['ward']}", use_container_width=True):
-                        st.session_state.selected_ward = item
-                        st.session_state.view = 'detail'
-                        st.rerun()
+                    st.button("Details", key=f"btn_{item['ward']}", use_container_width=True,
+                              on_click=open_ward, args=(item['ward'],))
 
-# Detail View
-elif st.session_state.view == 'detail':
-    ward = st.session_state.selected_ward
-    
-    col_back, col_title = st.columns([1, 4])
-    with col_back:
-        if st.button("⬅️ Back", use_container_width=True):
-            st.session_state.view = 'dashboard'
-            st.rerun()
-    with col_title:
-        st.subheader(f"Ward {ward['ward']} Report")
+@st.fragment
+@metrics.timed(metrics.SECTION_SECONDS, section="ward_detail")
+def ward_detail(ulb, ward_num):
+    snapshot = get_snapshot()
+    ward = next((w for w in snapshot.by_ulb.get(ulb, ()) if w['ward'] == ward_num), None)
+    if ward is None:
+        st.info("This ward has not been polled yet.")
+        return
     
+    if ward.get('stale'):
+        st.warning(f"TSEC is not responding. Showing the result last fetched {format_age(ward.get('updated_at'))}.")
+
+    declared_at = get_poller().store.declared_at((ward['district_id'], ward['ulb_id'], ward['ward']))
+    if declared_at:
+        st.caption(f"Declared at {time.strftime('%H:%M', time.localtime(declared_at))}")
+
     summary = ward.get('summary', {})
     
     st.markdown("---")
@@ -255,8 +237,15 @@ elif st.session_state.view == 'detail':
 
     st.markdown("### Candidate Table")
     
-    if ward['candidates']:
-        df = pd.DataFrame(ward['candidates'])
+    model = analytics.for_snapshot(snapshot)
+    candidates = model.ward_candidates(ulb, ward_num)
+    if len(candidates):
+        margin = model.margins(ulb)
+        margin = margin[margin['ward'] == ward_num]
+        if len(margin):
+            st.caption(f"Winning margin: {int(margin['margin'].iloc[0])} votes")
+        section_started = time.perf_counter()
+        df = candidates[list(CANDIDATE_COLUMNS)].rename(columns=CANDIDATE_COLUMNS)
         
         def style_rows(row):
             styles = [''] * len(row)
@@ -275,5 +264,68 @@ elif st.session_state.view == 'detail':
                 "Votes": st.column_config.NumberColumn("Votes", format="%d"),
             }
         )
+        metrics.SECTION_SECONDS.labels(section="candidate_table").observe(time.perf_counter() - section_started)
     else:
-        st.info("No detailed candidate data available yet.")
\ No newline at end of file
+        st.info("No detailed candidate data available yet.")
+
+# --- UI LOGIC ---
+
+# Main Dashboard View
+if st.session_state.view == 'dashboard':
+    
+    # 1. Mobile Friendly Header
+    head_col1, head_col2 = st.columns([3, 1])
+    
+    with head_col1:
+        if len(TARGETS) > 1:
+            # Picking a ULB only changes which part of the shared snapshot is shown
+            st.session_state.ulb = st.selectbox(
+                "Municipality",
+                [t.key for t in TARGETS],
+                index=[t.key for t in TARGETS].index(st.session_state.ulb),
+                format_func=lambda key: TARGETS_BY_KEY[key].label,
+                label_visibility="collapsed",
+            )
+        target = TARGETS_BY_KEY[st.session_state.ulb]
+        st.title(f"🗳️ {target.name} Election")
+        st.caption(f"{target.district} District | Municipal Results {target.year}")
+        if archive.REPLAY_PATH:
+            st.caption(f"Replay of {archive.REPLAY_PATH} at {archive.REPLAY_SPEED:g}x speed")
+        
+    with head_col2:
+        st.write("") 
+        # Refresh only re-reads the latest snapshot; the poller owns the crawl.
+        if st.button("🔄 Refresh", type="primary", use_container_width=True):
+            st.rerun()
+
+    # 2. Move to the latest snapshot, waiting for the first one, before drawing the fragments
+    advance_snapshot()
+
+    # 3. Summary metrics
+    results_panel(st.session_state.ulb)
+
+    st.markdown("### Wards Overview")
+
+    # 4. Ward cards
+    ward_grid(st.session_state.ulb)
+
+# Detail View
+elif st.session_state.view == 'detail':
+    col_back, col_title = st.columns([1, 4])
+    with col_back:
+        st.button("⬅️ Back", use_container_width=True, on_click=close_ward)
+    with col_title:
+        st.subheader(f"Ward {st.session_state.selected_ward} Report")
+
+    advance_snapshot()
+    ward_detail(st.session_state.ulb, st.session_state.selected_ward)
+
+# Reruns the page when a new snapshot is published
+watch_snapshot()
+
+# --- DEBUG PANEL ---
+# Open the page with ?debug=1 to see the scraper metrics served on /metrics
+metrics.RERUN_SECONDS.observe(time.perf_counter() - rerun_started)
+if st.query_params.get("debug"):
+    with st.expander("Debug metrics"):
+        st.code(metrics.REGISTRY.render(), language="text")
@@ -0,0 +1,89 @@
+import argparse
+import logging
+import sys
+import time
+
+from tabulate import tabulate
+
+from config import TARGETS, TARGETS_BY_KEY
+from poller import POLL_INTERVAL, Poller
+
+# --- TERMINAL WATCHER ---
+# Polls TSEC without any UI and prints only the wards whose status or votes
+# changed since the previous cycle. Uses the same poller as the dashboard
+# (freezing, pacing, deadlines) but no Streamlit, pandas or result store.
+
+HEADERS = ["Time", "ULB", "Ward", "Status", "Leading / Won", "Party", "Votes", "Margin"]
+
+
+def fingerprint(result):
+    """What the watcher reports on: the ward status and every candidate's votes."""
+    return result['status'], tuple((c['Candidate Name'], c['Votes']) for c in result.get('candidates', ()))
+
+
+def change_row(result, now):
+    candidates = sorted(result.get('candidates', ()), key=lambda c: c['Votes'], reverse=True)
+    leader = candidates[0] if candidates else None
+    margin = leader['Votes'] - candidates[1]['Votes'] if len(candidates) > 1 else None
+    target = TARGETS_BY_KEY[(result['district_id'], result['ulb_id'])]
+    return [
+        time.strftime('%H:%M:%S', time.localtime(now)),
+        target.name,
+        result['ward'],
+        result['status'] + (" (stale)" if result.get('stale') else ""),
+        leader['Candidate Name'] if leader else "",
+        leader['Party'] if leader else "",
+        leader['Votes'] if leader else "",
+        margin if margin is not None else "",
+    ]
+
+
+def parse_ulb(value):
+    district_id, sep, ulb_id = value.partition(':')
+    if not sep or (district_id, ulb_id) not in TARGETS_BY_KEY:
+        known = ", ".join(f"{t.district_id}:{t.ulb_id} ({t.name})" for t in TARGETS)
+        raise argparse.ArgumentTypeError(f"unknown ULB {value!r}; configured: {known}")
+    return district_id, ulb_id
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch TSEC results in the terminal and print only what changed.")
+    parser.add_argument("--ulb", action="append", type=parse_ulb, metavar="DISTRICT:ULB",
+                        help="ULB to watch, e.g. 24:1 (repeatable; default: every ULB in the targets file)")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="seconds between cycles (default: %(default)s)")
+    parser.add_argument("--once", action="store_true", help="run a single cycle and exit")
+    parser.add_argument("--format", default="simple", help="tabulate table format (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(name)s %(message)s")
+    ulbs = args.ulb or [t.key for t in TARGETS]
+    wards = [key for ulb in ulbs for key in TARGETS_BY_KEY[ulb].ward_keys()]
+    poller = Poller(wards=wards, interval=args.interval)
+
+    seen = {}
+    while True:
+        started = time.monotonic()
+        snapshot = poller.run_once()
+        rows = []
+        for result in snapshot.wards:
+            key = (result['district_id'], result['ulb_id'], result['ward'])
+            current = fingerprint(result)
+            if seen.get(key) != current:
+                seen[key] = current
+                rows.append(change_row(result, snapshot.fetched_at))
+        if rows:
+            print(tabulate(rows, headers=HEADERS, tablefmt=args.format), flush=True)
+            print(flush=True)
+        if args.once:
+            return 0
+        try:
+            time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(0)